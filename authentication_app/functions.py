@@ -1,8 +1,10 @@
+import django_rq
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from videoflix import settings
 from django.core.signing import TimestampSigner
 from django.contrib.auth import get_user_model
+from rq import Retry
 import os
 
 signer = TimestampSigner()
@@ -12,7 +14,7 @@ FRONTEND_BASE_URL = os.getenv('FRONTEND_BASE_URL', default='http://localhost:420
 
 def send_verification_email(request, user):
     """
-    This function sends the verification email to the user. The HTML is created in the templates folder.
+    This function sends the verification email to the user. The HTML is created in the templates folder. The email is sent in the background.
     """
     token = signer.sign(user.email)
     subject = "Confirm your email"
@@ -21,18 +23,12 @@ def send_verification_email(request, user):
         "verification_email.html", {"user": user, "verification_url": verification_url}
     )
     recipient_list = [user.email]
-    send_mail(
-        subject,
-        "",
-        settings.DEFAULT_FROM_EMAIL,
-        recipient_list,
-        html_message=html_message,
-    )
+    enqueue_email(subject, recipient_list, html_message)
 
 
 def send_reset_password_email(request, email):
     """
-    This function sends the reset password email to the user. The HTML is created in the templates folder.
+    This function sends the reset password email to the user. The HTML is created in the templates folder. The email is sent in the background.
     """
     token = signer.sign(email)
     subject = "Reset Videoflix password"
@@ -41,10 +37,20 @@ def send_reset_password_email(request, email):
         "reset_password_email.html", {"reset_password_url": reset_password_url}
     )
     recipient_list = [email]
-    send_mail(
+    enqueue_email(subject, recipient_list, html_message)
+
+
+def enqueue_email(subject, recipient_list, html_message):
+    """
+    This function queues an email on the background queue, so the request does not wait for the mail server and a backlog of transcode jobs never delays it.
+    """
+    queue = django_rq.get_queue("background", autocommit=True)
+    queue.enqueue(
+        send_mail,
         subject,
         "",
         settings.DEFAULT_FROM_EMAIL,
         recipient_list,
         html_message=html_message,
+        retry=Retry(max=2),
     )
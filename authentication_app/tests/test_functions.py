@@ -11,6 +11,10 @@ signer = TimestampSigner()
 FRONTEND_BASE_URL = os.getenv('FRONTEND_BASE_URL', default='http://localhost:4200')
 
 
+def run_job(func, *args, retry=None, **kwargs):
+    return func(*args, **kwargs)
+
+
 class ResetPasswordEmailTests(TestCase):
 
     def setUp(self):
@@ -19,6 +23,10 @@ class ResetPasswordEmailTests(TestCase):
             email="testuser@example.com",
             password="password123"
         )
+        patcher = patch("authentication_app.functions.django_rq.get_queue")
+        self.mock_get_queue = patcher.start()
+        self.mock_get_queue.return_value.enqueue.side_effect = run_job
+        self.addCleanup(patcher.stop)
 
     def test_email_is_sent(self):
         send_reset_password_email(request=None, email=self.user.email)
@@ -55,11 +63,19 @@ class SendVerificationEmailTests(TestCase):
             email="testuser@example.com",
             password="password123"
         )
+        patcher = patch("authentication_app.functions.django_rq.get_queue")
+        self.mock_get_queue = patcher.start()
+        self.mock_get_queue.return_value.enqueue.side_effect = run_job
+        self.addCleanup(patcher.stop)
 
     def test_email_is_sent(self):
         send_verification_email(request=None, user=self.user)
         self.assertEqual(len(mail.outbox), 1)
 
+    def test_email_is_sent_in_the_background(self):
+        send_verification_email(request=None, user=self.user)
+        self.mock_get_queue.assert_called_once_with("background", autocommit=True)
+
     @patch('authentication_app.functions.signer.sign', return_value='fixed_token')
     def test_email_contains_correct_content(self, mock_sign):
         send_verification_email(request=None, user=self.user)
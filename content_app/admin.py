@@ -1,7 +1,8 @@
 from django.contrib import admin
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
-from .models import Video
+from .functions import get_transcode_progress
+from .models import Rendition, Video
 
 
 class VideoResource(resources.ModelResource):
@@ -10,8 +11,35 @@ class VideoResource(resources.ModelResource):
         model = Video
 
 
+class RenditionInline(admin.TabularInline):
+    model = Rendition
+    fields = [
+        "name",
+        "media_type",
+        "resolution",
+        "bandwidth",
+        "average_bandwidth",
+        "codecs",
+        "playlist",
+        "size",
+        "segment_count",
+    ]
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        """
+        This function hides the add button, because the renditions are only created by the conversion.
+        """
+        return False
+
+
 @admin.register(Video)
 class VideoAdmin(ImportExportModelAdmin):
+    list_display = ["title", "category", "created_at", "transcode_progress"]
+    inlines = [RenditionInline]
+
     def get_fields(self, request, obj=None):
         """
         This function determines what fields are displayed when adding a new video and editing a video.
@@ -35,11 +63,20 @@ class VideoAdmin(ImportExportModelAdmin):
                 "category",
                 "video_file",
                 "thumbnail",
+                "thumbnail_variants",
                 "teaser",
-                "hls_file_360",
-                "hls_file_480",
-                "hls_file_720",
-                "hls_file_1080",
+                "teaser_optimized",
+                "teaser_hls_file",
+                "source_hash",
+                "ladder_fingerprint",
+                "hls_master_file",
+                "storyboard",
+                "duration",
+                "width",
+                "height",
+                "bitrate",
+                "video_codec",
+                "audio_codec",
             ]
 
     def get_readonly_fields(self, request, obj=None):
@@ -50,10 +87,32 @@ class VideoAdmin(ImportExportModelAdmin):
             return [
                 "id",
                 "video_file",
-                "hls_file_360",
-                "hls_file_480",
-                "hls_file_720",
-                "hls_file_1080",
+                "thumbnail_variants",
+                "teaser_optimized",
+                "teaser_hls_file",
+                "source_hash",
+                "ladder_fingerprint",
+                "hls_master_file",
+                "storyboard",
+                "duration",
+                "width",
+                "height",
+                "bitrate",
+                "video_codec",
+                "audio_codec",
             ]
         else:
             return []
+
+    @admin.display(description="Transcode progress")
+    def transcode_progress(self, obj):
+        """
+        This function shows the live progress of the conversion in the video list, so slow encodes can be spotted.
+        """
+        progress = get_transcode_progress(obj.id)
+        if not progress:
+            return "-"
+        return ", ".join(
+            f"{label}: {state['percent']}% ({state['fps']} fps, {state['speed']}x)"
+            for label, state in progress.items()
+        )
@@ -1,4 +1,23 @@
-from content_app.models import Video
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import time
+from functools import lru_cache
+from urllib.parse import quote, unquote, urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare, salted_hmac
+from content_app.models import Rendition, UploadSession, Video, video_upload_to
+from content_app.tasks import SOURCE_HASH_START, hash_block
 from content_app.serializers import (
     DashboardVideoSerializer,
     HeroVideoSerializer,
@@ -7,11 +26,14 @@ from content_app.serializers import (
 from watch_history_app.models import WatchHistory
 
 
+DASHBOARD_VIDEO_FIELDS = ["id", "created_at", "category", "thumbnail", "thumbnail_variants"]
+
+
 def get_latest_videos():
     """
     This function gets the 6 latest videos and serializes them.
     """
-    latest_videos = Video.objects.order_by("-created_at")[:6]
+    latest_videos = Video.objects.only(*DASHBOARD_VIDEO_FIELDS).order_by("-created_at")[:6]
     latest_videos_serialized = DashboardVideoSerializer(latest_videos, many=True).data
     return latest_videos_serialized
 
@@ -24,19 +46,28 @@ def get_my_videos(request):
         "video"
     )
     video_ids = watch_history.values_list("video__id", flat=True)
-    my_videos = Video.objects.filter(id__in=video_ids)
+    my_videos = Video.objects.only(*DASHBOARD_VIDEO_FIELDS).filter(id__in=video_ids)
     my_videos_serialized = DashboardVideoSerializer(my_videos, many=True).data
     return my_videos_serialized
 
 
-def get_category_videos(categories):
+def get_category_videos():
     """
-    This function goes through the videos and returns all categories.
+    This function returns the newest DASHBOARD_CATEGORY_VIDEOS videos of every category with one query.
     """
+    videos = (
+        Video.objects.only(*DASHBOARD_VIDEO_FIELDS)
+        .annotate(
+            category_rank=Window(
+                RowNumber(), partition_by=F("category"), order_by=[F("created_at").desc(), F("id").desc()]
+            )
+        )
+        .filter(category_rank__lte=settings.DASHBOARD_CATEGORY_VIDEOS)
+        .order_by("category", "-created_at", "-id")
+    )
     category_videos = {}
-    for category in categories:
-        videos = Video.objects.filter(category=category)
-        category_videos[category] = DashboardVideoSerializer(videos, many=True).data
+    for video in DashboardVideoSerializer(videos, many=True).data:
+        category_videos.setdefault(video["category"], []).append(video)
     return category_videos
 
 
@@ -61,9 +92,15 @@ def get_selected_video(video_id):
 
 def get_video(video_id, user, resolution):
     """
-    This function gets the video the user picks and serializes it.
+    This function gets the video the user picks and serializes it. Only the columns the serializer needs are loaded and the renditions are fetched with one prefetch.
     """
-    video = Video.objects.get(id=video_id)
+    video = (
+        Video.objects.only("id", "title", "hls_master_file", "storyboard")
+        .prefetch_related(
+            Prefetch("renditions", queryset=Rendition.objects.only("video_id", "media_type", "height", "playlist"))
+        )
+        .get(id=video_id)
+    )
     serializer = VideoSerializer(
         video, context={"user": user, "resolution": resolution}
     )
@@ -79,3 +116,325 @@ def get_user_timestamp(user, video_id):
         return watch_history.timestamp
     except WatchHistory.DoesNotExist:
         return 0
+
+
+def get_content_etag(*parts):
+    """
+    This function returns a weak ETag for a response that is built from the given versions and query parameters.
+    """
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def get_not_modified_response(request, etag, cache_control):
+    """
+    This function compares the ETag with the If-None-Match header of the request. If the client already has the response, a 304 response with the cache headers is returned, else None.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_cache_headers(response, etag, cache_control)
+    return response
+
+
+def set_cache_headers(response, etag, cache_control):
+    """
+    This function adds the ETag and the Cache-Control header to a response. The responses are only sent to users with a token, so they vary by the Authorization header.
+    """
+    response["ETag"] = etag
+    patch_cache_control(response, **cache_control)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+def get_transcode_progress(video_id):
+    """
+    This function returns the progress of the conversion of a video, which the rq-worker publishes for every resolution or chunk.
+    """
+    labels = cache.get(f"transcode_progress_{video_id}", [])
+    progress = cache.get_many([f"transcode_progress_{video_id}_{label}" for label in labels])
+    return {
+        label: progress.get(
+            f"transcode_progress_{video_id}_{label}",
+            {"percent": 0, "fps": 0, "speed": 0, "done": False},
+        )
+        for label in labels
+    }
+
+
+def get_upload_part_path(upload_session):
+    """
+    This function returns the path of the partial file of an upload.
+    """
+    return os.path.join(settings.UPLOAD_DIR, f"{upload_session.id}.part")
+
+
+def write_upload_chunk(upload_session, offset, stream, content_length):
+    """
+    This function streams a chunk of an upload into the partial file, adds its full blocks to the hash and returns the new offset.
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    part_path = get_upload_part_path(upload_session)
+    block_size = settings.UPLOAD_BLOCK_SIZE
+    source_hash = upload_session.source_hash or SOURCE_HASH_START
+    with open(part_path, "r+b" if os.path.exists(part_path) else "w+b") as file:
+        # The saved hash only covers full blocks, so the start of the last block is read again.
+        file.seek(offset - offset % block_size)
+        pending = bytearray(file.read(offset % block_size))
+        file.seek(offset)
+        file.truncate()
+        remaining = content_length
+        while remaining > 0:
+            block = stream.read(min(block_size - len(pending), remaining))
+            if not block:
+                break
+            file.write(block)
+            remaining -= len(block)
+            pending += block
+            if len(pending) == block_size:
+                source_hash = hash_block(source_hash, pending)
+                pending = bytearray()
+        new_offset = file.tell()
+
+    UploadSession.objects.filter(id=upload_session.id).update(offset=new_offset, source_hash=source_hash)
+    upload_session.offset = new_offset
+    upload_session.source_hash = source_hash
+    return new_offset
+
+
+def complete_upload(upload_session):
+    """
+    This function finishes the hash of an upload, moves the file to the folder of the video and creates the video.
+    """
+    part_path = get_upload_part_path(upload_session)
+    source_hash = upload_session.source_hash or SOURCE_HASH_START
+    with open(part_path, "rb") as file:
+        file.seek(upload_session.size - upload_session.size % settings.UPLOAD_BLOCK_SIZE)
+        if last_block := file.read():
+            source_hash = hash_block(source_hash, last_block)
+
+    file_name = default_storage.get_available_name(video_upload_to(upload_session, upload_session.filename))
+    file_path = os.path.join(settings.MEDIA_ROOT, file_name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    shutil.move(part_path, file_path)
+
+    video = Video.objects.create(
+        title=upload_session.title,
+        description=upload_session.description,
+        category=upload_session.category,
+        thumbnail=upload_session.thumbnail.name,
+        teaser=upload_session.teaser.name,
+        video_file=file_name,
+        source_hash=source_hash,
+    )
+    UploadSession.objects.filter(id=upload_session.id).update(video=video)
+    upload_session.video = video
+    return video
+
+
+PLAYLIST_CACHE_SIZE = 512
+
+MEDIA_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".mp4": "video/mp4",
+    ".vtt": "text/vtt",
+}
+
+
+def get_media_path(path):
+    """
+    This function returns the path of a media file on the disk. If the path leaves the media folder or is not a file, it returns None.
+    """
+    try:
+        file_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        return None
+    return file_path if os.path.isfile(file_path) else None
+
+
+def get_media_name(file_path):
+    """
+    This function returns the normalized name of a media file relative to the media folder.
+    """
+    return os.path.relpath(file_path, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, "/")
+
+
+def send_media_file(request, file_path):
+    """
+    This function sends a media file or a range of it with X-Accel-Redirect, X-Sendfile or os.sendfile.
+    """
+    content_type = MEDIA_CONTENT_TYPES.get(os.path.splitext(file_path)[1]) or (
+        mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    )
+    backend = getattr(settings, "MEDIA_SENDFILE_BACKEND", "")
+    if backend == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = quote(settings.MEDIA_ACCEL_PREFIX + get_media_name(file_path))
+        return response
+    if backend == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = file_path
+        return response
+
+    size = os.path.getsize(file_path)
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(file_path, "rb")
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        response = FileResponse(file, content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def parse_range(range_header, size):
+    """
+    This function returns the first and the last byte of a single Range header or None.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (range_header or "").strip())
+    if not match or not any(match.groups()):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"The range {range_header} is not satisfiable.")
+    return start, end
+
+
+class RangeFile:
+    """
+    A file that is read from a start position and ends after a number of bytes. It keeps the file descriptor, so the server can still send it with os.sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def sign_video_urls(video, user, video_id):
+    """
+    This function adds a signature for the user to the URLs of the HLS file and the storyboard of serialized video data.
+    """
+    for field_name in ["hls_file", "storyboard"]:
+        if video.get(field_name):
+            video[field_name] = sign_media_url(video[field_name], user.id, video_id)
+    return video
+
+
+def sign_media_url(url, user_id, video_id):
+    """
+    This function adds a signature to the URL of a media file, which allows the user to load all files in its folder.
+    """
+    folder = os.path.dirname(unquote(url[len(settings.MEDIA_URL):])) + "/"
+    expires = media_url_expiry()
+    signature = media_signature(user_id, video_id, expires, folder)
+    return f"{url}?{urlencode({'user': user_id, 'video': video_id, 'expires': expires, 'signature': signature})}"
+
+
+def media_url_expiry():
+    """
+    This function returns the expiry of the media URLs that are signed now. It is rounded up to five minutes, so the URL stays the same for repeated requests.
+    """
+    return (int(time.time()) + settings.SIGNED_MEDIA_MAX_AGE) // 300 * 300 + 300
+
+
+def media_signature(user_id, video_id, expires, folder):
+    """
+    This function returns the HMAC of a media signature. It only needs the secret key, so no database or cache is used.
+    """
+    return salted_hmac(
+        "content_app.media", f"{user_id}:{video_id}:{expires}:{folder}", algorithm="sha256"
+    ).hexdigest()
+
+
+def check_media_access(request, media_name):
+    """
+    This function checks if a media file is public or has a valid signature for its folder.
+    """
+    if not any(re.match(pattern, media_name) for pattern in settings.SIGNED_MEDIA_PATHS):
+        return True
+    if any(re.match(pattern, media_name) for pattern in settings.PUBLIC_MEDIA_PATHS):
+        return True
+
+    try:
+        expires = int(request.GET["expires"])
+        user_id, video_id, signature = request.GET["user"], request.GET["video"], request.GET["signature"]
+    except (KeyError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    folder = os.path.dirname(media_name) + "/"
+    return constant_time_compare(media_signature(user_id, video_id, expires, folder), signature)
+
+
+def media_query_string(request):
+    """
+    This function returns the signature of a media request as a query string.
+    """
+    return urlencode({key: request.GET[key] for key in ["user", "video", "expires", "signature"]})
+
+
+def sign_playlist(file_path, query_string, segment_host=""):
+    """
+    This function adds the signature of the request to every URI of a playlist or storyboard.
+    """
+    stat = os.stat(file_path)
+    template = parse_playlist(file_path, stat.st_mtime_ns, stat.st_size)
+    return template.format(host=segment_host, query=f"?{query_string}")
+
+
+@lru_cache(maxsize=PLAYLIST_CACHE_SIZE)
+def parse_playlist(file_path, modified, size):
+    """
+    This function turns a playlist or storyboard into a template, which is cached until the file changes.
+    """
+    with open(file_path) as file:
+        content = file.read()
+
+    lines = []
+    for line in content.splitlines():
+        line = line.replace("{", "{{").replace("}", "}}")
+        if file_path.endswith(".vtt"):
+            line = re.sub(r"^[^\s#]+\.jpg", lambda match: template_uri(match[0]), line)
+        elif line and not line.startswith("#"):
+            line = template_uri(line)
+        else:
+            line = re.sub(r'URI="([^"]+)"', lambda match: f'URI="{template_uri(match[1])}"', line)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def template_uri(uri):
+    """
+    This function adds the placeholders for the host and the query string to a URI of a playlist.
+    """
+    host = "" if uri.endswith(".m3u8") else "{host}"
+    return f"{host}{uri}{{query}}"
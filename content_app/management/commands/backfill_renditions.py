@@ -0,0 +1,27 @@
+import os
+from django.core.management.base import BaseCommand
+from content_app.models import Video
+from content_app.tasks import prepare_conversion, save_renditions, select_renditions, verify_rendition
+
+
+class Command(BaseCommand):
+    help = "Creates the renditions of videos that were converted before the renditions were stored in their own table."
+
+    def handle(self, *args, **options):
+        """
+        This function looks for the HLS files of every rung of the ladder and every audio track on the disk and saves a rendition for every complete playlist that is not saved yet.
+        """
+        created_count = 0
+        for video_instance in Video.objects.prefetch_related("renditions"):
+            source_path, base_name, output_dir = prepare_conversion(video_instance)
+            saved_names = {rendition.name for rendition in video_instance.renditions.all()}
+            resolutions = select_renditions(video_instance)
+            m3u8_files = {}
+            for suffix in resolutions:
+                m3u8_path = os.path.join(output_dir, f"{base_name}_{suffix}.m3u8")
+                if suffix not in saved_names and verify_rendition(m3u8_path, video_instance.duration):
+                    m3u8_files[suffix] = m3u8_path
+            save_renditions(video_instance.id, resolutions, m3u8_files)
+            created_count += len(m3u8_files)
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created_count} renditions."))
@@ -0,0 +1,272 @@
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+from content_app import tasks
+from content_app.models import Video
+from content_app.tasks import enqueue_conversion, ladder_fingerprint
+
+# The throwaway database counts the ids from 1 again, so the benchmark video gets an id far above the real ones.
+# Its progress in the cache cannot overwrite the progress of a real video.
+BENCHMARK_VIDEO_ID = 2**62
+
+
+class Command(BaseCommand):
+    help = "Converts synthetic test clips with the HLS pipeline and reports the time, memory and disk use as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--durations", default="10,60", help="Comma separated lengths of the test clips in seconds."
+        )
+        parser.add_argument(
+            "--resolutions", default="1280x720,1920x1080", help="Comma separated resolutions of the test clips."
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["single_pass", "per_rendition", "chunked"],
+            default=getattr(settings, "TRANSCODE_MODE", "single_pass"),
+            help="The transcode mode to benchmark. Defaults to TRANSCODE_MODE.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="The number of RQ workers that run the jobs of a conversion in parallel.",
+        )
+        parser.add_argument("--output", help="Writes the report to this file instead of the console.")
+        parser.add_argument("--keep", action="store_true", help="Keeps the test clips and the HLS files.")
+
+    def handle(self, *args, **options):
+        """
+        This function converts a test clip for every length and resolution and writes a JSON report of the runs.
+        """
+        # The clips are converted in a throwaway database, so their videos never show up in the catalog.
+        old_config = setup_databases(verbosity=0, interactive=False)
+        run_id = uuid.uuid4().hex[:8]
+        results = []
+        try:
+            for resolution in options["resolutions"].split(","):
+                for duration in options["durations"].split(","):
+                    title = f"benchmark_{run_id}_{resolution}_{duration}s"
+                    clip_dir = os.path.join(settings.MEDIA_ROOT, "videos", title)
+                    try:
+                        clip_path = create_clip(clip_dir, resolution, float(duration))
+                        results.append(
+                            benchmark_clip(clip_path, title, resolution, float(duration), options["mode"], options["workers"])
+                        )
+                    finally:
+                        if not options["keep"]:
+                            shutil.rmtree(clip_dir, ignore_errors=True)
+                    self.stderr.write(f"{resolution} {duration}s: {results[-1]['wall_seconds']:.1f}s")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        if options["keep"]:
+            self.stderr.write(f"The clips and HLS files were kept in the benchmark_{run_id}_* folders of the videos.")
+
+        report = json.dumps(
+            {
+                "mode": options["mode"],
+                "workers": options["workers"],
+                "segment_type": settings.HLS_SEGMENT_TYPE,
+                "ladder_fingerprint": ladder_fingerprint(),
+                "ladder": settings.HLS_LADDER,
+                "results": results,
+            },
+            indent=2,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(report + "\n")
+        else:
+            self.stdout.write(report)
+
+
+def create_clip(clip_dir, resolution, duration):
+    """
+    This function uses the lavfi sources of FFmpeg to create a test clip with moving video and a sine tone. The clip is encoded bitexact, so every run converts the same input.
+    """
+    os.makedirs(clip_dir, exist_ok=True)
+    clip_path = os.path.join(clip_dir, "clip.mp4")
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-v", "error",
+        "-f", "lavfi",
+        "-i", f"testsrc2=size={resolution}:rate=25:duration={duration}",
+        "-f", "lavfi",
+        "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "18",
+        "-g", "50",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-b:a", "192k",
+        "-bitexact",
+        "-shortest",
+        clip_path,
+    ]
+    subprocess.run(cmd, check=True)
+    return clip_path
+
+
+def benchmark_clip(clip_path, title, resolution, duration, mode, workers):
+    """
+    This function converts a test clip in a child process and measures its time, memory and disk use.
+    """
+    video_dir = os.path.dirname(clip_path)
+    clip_bytes = os.path.getsize(clip_path)
+    peak_disk_use = [0]
+    finished = threading.Event()
+
+    def sample_disk_use():
+        while not finished.wait(0.2):
+            peak_disk_use[0] = max(peak_disk_use[0], directory_size(video_dir) - clip_bytes)
+
+    # The child opens its own database connections, so the connections of the parent must not be shared with it.
+    connections.close_all()
+    sampler = threading.Thread(target=sample_disk_use, daemon=True)
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=measure_transcode, args=(sender, clip_path, title, mode, workers))
+
+    start = time.perf_counter()
+    sampler.start()
+    process.start()
+    usage = receiver.recv()
+    process.join()
+    wall_seconds = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+    if "error" in usage:
+        raise RuntimeError(f"The conversion of {clip_path} failed. {usage['error']}")
+
+    output_bytes = directory_size(video_dir) - clip_bytes
+    return {
+        "resolution": resolution,
+        "duration": duration,
+        "wall_seconds": round(wall_seconds, 3),
+        "wall_seconds_per_minute": round(wall_seconds / duration * 60, 3),
+        "cpu_seconds": round(usage["cpu_seconds"], 3),
+        "peak_rss_mb": round(usage["peak_rss_mb"], 1),
+        "scratch_bytes": max(peak_disk_use[0] - output_bytes, 0),
+        "output_bytes": output_bytes,
+        "renditions": usage["renditions"],
+    }
+
+
+def measure_transcode(sender, clip_path, title, mode, workers):
+    """
+    This function converts a clip in the child process and sends its renditions and resource usage to the parent.
+    """
+    try:
+        renditions = transcode_clip(clip_path, title, mode, workers)
+    except Exception as e:
+        sender.send({"error": str(e)})
+        return
+
+    usage = [resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)]
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    sender.send({
+        "renditions": renditions,
+        "cpu_seconds": sum(rusage.ru_utime + rusage.ru_stime for rusage in usage),
+        "peak_rss_mb": max(rusage.ru_maxrss for rusage in usage) * rss_unit / 1024 / 1024,
+    })
+
+
+def transcode_clip(clip_path, title, mode, workers):
+    """
+    This function converts a clip with the jobs of an uploaded video on a BenchmarkQueue and returns its renditions.
+    """
+    # bulk_create skips the signals, so the conversion is only queued once with the mode of the benchmark.
+    video = Video.objects.bulk_create([
+        Video(
+            id=BENCHMARK_VIDEO_ID,
+            title=title,
+            description="Benchmark",
+            video_file=os.path.relpath(clip_path, settings.MEDIA_ROOT),
+        )
+    ])[0]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue = BenchmarkQueue(executor)
+        tasks.queue_getter = lambda name: queue
+        try:
+            enqueue_conversion(video.id, mode)
+            queue.join()
+            return {
+                rendition.name: {
+                    "size": rendition.size,
+                    "segment_count": rendition.segment_count,
+                    "average_bandwidth": rendition.average_bandwidth,
+                    "bandwidth": rendition.bandwidth,
+                }
+                for rendition in video.renditions.order_by("-media_type", "height", "name")
+            }
+        finally:
+            tasks.queue_getter = None
+            # Without the video file the delete signal keeps the HLS files, so --keep can keep them.
+            video.video_file = ""
+            video.delete()
+
+
+class BenchmarkQueue:
+    """
+    A stand-in for the RQ queues that runs the jobs of a benchmark on a pool of threads.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.jobs = []
+
+    def enqueue(self, func, *args, depends_on=None, **kwargs):
+        def run():
+            try:
+                for job in depends_on or []:
+                    job.result()
+                return func(*args)
+            finally:
+                connections.close_all()
+
+        job = self.executor.submit(run)
+        self.jobs.append(job)
+        return job
+
+    def join(self):
+        """
+        This function waits for all jobs, including the jobs that were queued by other jobs, and raises the first error.
+        """
+        errors = []
+        index = 0
+        while index < len(self.jobs):
+            error = self.jobs[index].exception()
+            if error:
+                errors.append(error)
+            index += 1
+        if errors:
+            raise errors[0]
+
+
+def directory_size(path):
+    """
+    This function returns the size of all files in a directory and its subdirectories in bytes.
+    """
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for file_name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file_name))
+            except FileNotFoundError:
+                pass
+    return size
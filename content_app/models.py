@@ -1,5 +1,7 @@
 import os
+import uuid
 from datetime import date
+from django.conf import settings
 from django.db import models
 import logging
 
@@ -16,6 +18,16 @@ def video_upload_to(instance, filename):
     return upload_path
 
 
+def teaser_upload_to(instance, filename):
+    """
+    This function creates the path of a teaser in the teaser folder of the video, which is served without a signature.
+    """
+    title_path = instance.title.replace(" ", "_")
+    upload_path = os.path.join("videos", title_path, "teaser", filename)
+    logger.debug(f"Teaser upload path: {upload_path}")
+    return upload_path
+
+
 def thumbnail_upload_to(instance, filename):
     """
     This function removes all empty spaces and replaces them with underscores. Then it creates the new path.
@@ -38,12 +50,68 @@ class Video(models.Model):
     category = models.CharField(
         max_length=20, choices=CATEGORY_CHOICES, default=CATEGORY_CHOICES[0][0])
     thumbnail = models.ImageField(upload_to=thumbnail_upload_to)
-    teaser = models.FileField(upload_to=video_upload_to)
+    thumbnail_variants = models.JSONField(default=dict, blank=True)
+    teaser = models.FileField(upload_to=teaser_upload_to)
+    teaser_optimized = models.FileField(max_length=255, blank=True, null=True)
+    teaser_hls_file = models.FileField(max_length=255, blank=True, null=True)
     video_file = models.FileField(upload_to=video_upload_to)
-    hls_file_360 = models.FileField(max_length=255, blank=True, null=True)
-    hls_file_480 = models.FileField(max_length=255, blank=True, null=True)
-    hls_file_720 = models.FileField(max_length=255, blank=True, null=True)
-    hls_file_1080 = models.FileField(max_length=255, blank=True, null=True)
+    source_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    ladder_fingerprint = models.CharField(max_length=64, blank=True)
+    hls_master_file = models.FileField(max_length=255, blank=True, null=True)
+    storyboard = models.FileField(max_length=255, blank=True, null=True)
+    duration = models.FloatField(blank=True, null=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    bitrate = models.PositiveIntegerField(blank=True, null=True)
+    video_codec = models.CharField(max_length=20, blank=True)
+    audio_codec = models.CharField(max_length=20, blank=True)
 
     def __str__(self):
         return self.title
+
+
+class Rendition(models.Model):
+    MEDIA_TYPE_CHOICES = [
+        ("video", "Video"),
+        ("audio", "Audio"),
+    ]
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="renditions")
+    name = models.CharField(max_length=20)
+    media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES, default=MEDIA_TYPE_CHOICES[0][0])
+    resolution = models.CharField(max_length=20, blank=True)
+    height = models.PositiveIntegerField(default=0)
+    bandwidth = models.PositiveIntegerField(default=0)
+    average_bandwidth = models.PositiveIntegerField(default=0)
+    codecs = models.CharField(max_length=50, blank=True)
+    playlist = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    segment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["height"]
+        constraints = [
+            models.UniqueConstraint(fields=["video", "name"], name="unique_video_rendition")
+        ]
+
+    def __str__(self):
+        return f"{self.video.title} {self.name}"
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    created_at = models.DateTimeField(auto_now_add=True)
+    title = models.CharField(max_length=80)
+    description = models.TextField(max_length=5000)
+    category = models.CharField(
+        max_length=20, choices=Video.CATEGORY_CHOICES, default=Video.CATEGORY_CHOICES[0][0])
+    thumbnail = models.ImageField(upload_to=thumbnail_upload_to)
+    teaser = models.FileField(upload_to=teaser_upload_to)
+    filename = models.CharField(max_length=200)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    source_hash = models.CharField(max_length=64, blank=True)
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, blank=True, null=True, related_name="upload_session")
+
+    def __str__(self):
+        return f"{self.title} ({self.offset}/{self.size})"
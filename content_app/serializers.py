@@ -1,40 +1,111 @@
+import os
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
 
 from watch_history_app.models import WatchHistory
-from .models import Video
+from .models import UploadSession, Video
 
 
 class DashboardVideoSerializer(serializers.ModelSerializer):
+    thumbnail_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Video
-        fields = ["id", "created_at", "category", "thumbnail"]
+        fields = ["id", "created_at", "category", "thumbnail", "thumbnail_srcset"]
+
+    def get_thumbnail_srcset(self, obj):
+        """
+        This function returns the smaller variants of the thumbnail as srcset for every format.
+        """
+        return {
+            image_format: ", ".join(
+                f"{default_storage.url(path)} {width}w"
+                for width, path in obj.thumbnail_variants.get(image_format, {}).items()
+            )
+            for image_format in ["webp", "jpeg"]
+        }
 
 
 class HeroVideoSerializer(serializers.ModelSerializer):
+    teaser = serializers.SerializerMethodField()
+    teaser_hls_file = serializers.SerializerMethodField()
+
     class Meta:
         model = Video
-        fields = ["id", "title", "description", "teaser"]
+        fields = ["id", "title", "description", "teaser", "teaser_hls_file"]
+
+    def get_teaser(self, obj):
+        """
+        This function returns the optimized teaser once it is ready, else the uploaded teaser.
+        """
+        teaser = obj.teaser_optimized or obj.teaser
+        return teaser.url if teaser else None
+
+    def get_teaser_hls_file(self, obj):
+        """
+        This function returns the master playlist of the teaser, if a HLS ladder was created for it.
+        """
+        return obj.teaser_hls_file.url if obj.teaser_hls_file else None
 
 
 class VideoSerializer(serializers.ModelSerializer):
     hls_file = serializers.SerializerMethodField()
+    resolutions = serializers.SerializerMethodField()
+    storyboard = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
-        fields = ["id", "title", "hls_file"]
+        fields = ["id", "title", "hls_file", "resolutions", "storyboard"]
 
     def get_hls_file(self, obj):
         """
         This function the HLS file depending on the given resolution.
         """
         resolution = self.context.get("resolution", "360")
+        selected_file = self.get_hls_field_mapping(obj).get(resolution)
+        return selected_file.url if selected_file else None
 
-        hls_field_mapping = {
-            "360": obj.hls_file_360,
-            "480": obj.hls_file_480,
-            "720": obj.hls_file_720,
-            "1080": obj.hls_file_1080,
+    def get_resolutions(self, obj):
+        """
+        This function returns the resolutions that were created for the video. Resolutions above the source are not created, so they are not returned.
+        """
+        return [
+            resolution
+            for resolution, hls_file in self.get_hls_field_mapping(obj).items()
+            if hls_file
+        ]
+
+    def get_storyboard(self, obj):
+        """
+        This function returns the WebVTT file of the storyboard, which maps the time of the video to the thumbnails in the sprites, so the player can show previews while seeking.
+        """
+        return obj.storyboard.url if obj.storyboard else None
+
+    def get_hls_field_mapping(self, obj):
+        """
+        This function maps the resolutions to the HLS files of the video from its prefetched renditions.
+        """
+        hls_files = {
+            str(rendition.height): rendition.playlist
+            for rendition in obj.renditions.all()
+            if rendition.media_type == "video"
         }
+        hls_files["auto"] = obj.hls_master_file
+        return hls_files
 
-        selected_file = hls_field_mapping.get(resolution)
-        return selected_file.url if selected_file else None
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ["id", "title", "description", "category", "thumbnail", "teaser", "filename", "size", "offset", "video"]
+        read_only_fields = ["id", "offset", "video"]
+
+    def validate_filename(self, filename):
+        """
+        This function removes the folders and the characters that are not allowed in a file name from the name of the uploaded file.
+        """
+        filename = get_valid_filename(os.path.basename(filename))
+        if not filename:
+            raise serializers.ValidationError("The file name is not valid.")
+        return filename
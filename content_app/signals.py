@@ -1,19 +1,77 @@
 import os
+from functools import partial
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from .models import Video
-from content_app.tasks import convert, delete_video_folder, delete_thumbnail_folder
-import django_rq
+from watch_history_app.models import WatchHistory
+from content_app.tasks import (
+    bump_content_version,
+    enqueue_conversion,
+    enqueue_teaser_optimization,
+    enqueue_thumbnail_variants,
+    optimized_teaser_name,
+    delete_video_folder,
+    delete_thumbnail_folder,
+)
 
 
 @receiver(post_save, sender=Video)
 def video_post_save(sender, instance, created, **kwargs):
     """
-    This function queues the creation of the HLS files to a rq-worker.
+    This function queues the creation of the HLS files to a rq-worker once the video is committed, so the worker finds it.
     """
     if created:
-        queue = django_rq.get_queue("default", autocommit=True)
-        queue.enqueue(convert, instance.id)
+        transaction.on_commit(partial(enqueue_conversion, instance.id))
+
+
+@receiver(post_init, sender=Video)
+def video_post_init(sender, instance, **kwargs):
+    """
+    This function remembers the files a video was loaded with, so a save only queues jobs for files that changed.
+    """
+    deferred_fields = instance.get_deferred_fields()
+    instance._loaded_files = {
+        field_name: getattr(instance, field_name).name
+        for field_name in ("thumbnail", "teaser")
+        if field_name not in deferred_fields
+    }
+
+
+def file_changed(instance, field_name, created):
+    """
+    This function checks if a file of a video is new or was replaced since the video was loaded and remembers it.
+    """
+    file_name = getattr(instance, field_name).name
+    changed = created or file_name != instance._loaded_files.get(field_name)
+    instance._loaded_files[field_name] = file_name
+    return changed
+
+
+@receiver(post_save, sender=Video)
+def thumbnail_post_save(sender, instance, created, **kwargs):
+    """
+    This function queues the creation of the thumbnail variants to a rq-worker whenever a new thumbnail is saved.
+    """
+    if (
+        file_changed(instance, "thumbnail", created)
+        and instance.thumbnail
+        and instance.thumbnail_variants.get("source") != instance.thumbnail.name
+    ):
+        enqueue_thumbnail_variants(instance.id)
+
+
+@receiver(post_save, sender=Video)
+def teaser_post_save(sender, instance, created, **kwargs):
+    """
+    This function queues the optimization of the teaser to a rq-worker whenever a new teaser is saved.
+    """
+    if (
+        file_changed(instance, "teaser", created)
+        and instance.teaser
+        and instance.teaser_optimized != optimized_teaser_name(instance)
+    ):
+        enqueue_teaser_optimization(instance.id)
 
 
 @receiver(post_delete, sender=Video)
@@ -34,3 +92,21 @@ def thumbnail_post_delete(sender, instance, **kwargs):
     if instance.thumbnail:
         thumbnail_folder = os.path.dirname(instance.thumbnail.path)
         delete_thumbnail_folder(thumbnail_folder)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def video_catalog_changed(sender, instance, **kwargs):
+    """
+    This function gives the catalog a new version whenever a video is saved or deleted, so the dashboard, hero and video responses get new ETags.
+    """
+    bump_content_version("catalog")
+
+
+@receiver(post_save, sender=WatchHistory)
+@receiver(post_delete, sender=WatchHistory)
+def watch_history_changed(sender, instance, **kwargs):
+    """
+    This function gives the watch history of a user a new version whenever an entry is saved or deleted.
+    """
+    bump_content_version(f"watch_history_{instance.user_id}")
@@ -1,9 +1,21 @@
+import hashlib
+import json
+import logging
+import math
 import os
+import re
 import shutil
 import subprocess
+import time
+import django_rq
 from django.conf import settings
-from django.db import transaction
-from content_app.models import Video
+from django.core.cache import cache
+from django.db import connection
+from PIL import Image
+from rq import Retry
+from content_app.models import Rendition, Video
+
+logger = logging.getLogger(__name__)
 
 
 def to_wsl_path(path):
@@ -17,36 +29,686 @@ def to_wsl_path(path):
     return path
 
 
+def get_content_versions(*names):
+    """
+    This function returns the versions of parts of the content, for example the catalog or the watch history of a user, with one cache request. A part without a version gets a new one.
+    """
+    keys = [f"content_version_{name}" for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_content_version(name):
+    """
+    This function gives a part of the content a new version, so the ETags that depend on it change.
+    """
+    cache.set(f"content_version_{name}", time.time_ns(), None)
+
+
+PROGRESS_TIMEOUT = 60 * 60 * 24
+
+queue_getter = None
+
+
+def get_queue(name):
+    """
+    This function returns the RQ queue with the given name. If queue_getter is set, its queue is used instead, so the benchmark can run the jobs on its own workers.
+    """
+    if queue_getter:
+        return queue_getter(name)
+    return django_rq.get_queue(name, autocommit=True)
+
+
+def enqueue_conversion(video_id, mode=None):
+    """
+    This function queues the routing of the conversion of a video to the "background" queue. It is called when a video is saved, so the source is not probed in the request.
+    """
+    queue = get_queue("background")
+    queue.enqueue(route_conversion, video_id, mode, job_timeout=settings.PROBE_TIMEOUT * 2, retry=Retry(max=2))
+
+
+def route_conversion(video_id, mode=None):
+    """
+    This function probes the source of a video and queues its conversion in the given mode to the queue for its duration.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    try:
+        probe_video(video_instance, to_wsl_path(video_instance.video_file.path))
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.warning(f"The source of video {video_id} could not be probed. {e}")
+    queue = get_queue(transcode_queue(video_instance.duration))
+    job_timeout = transcode_timeout(video_instance.duration)
+    mode = mode or getattr(settings, "TRANSCODE_MODE", "single_pass")
+
+    if mode == "per_rendition":
+        queue.enqueue(queue_renditions, video_id, job_timeout=job_timeout, retry=Retry(max=2))
+    elif mode == "chunked":
+        queue.enqueue(split_into_chunks, video_id, job_timeout=job_timeout, retry=Retry(max=2))
+    else:
+        queue.enqueue(convert, video_id, job_timeout=job_timeout, retry=Retry(max=2))
+
+
+def transcode_queue(duration):
+    """
+    This function returns the name of the queue for a source of the given duration in seconds. Short sources go to queues that the workers empty first.
+    """
+    transcode_queues = settings.TRANSCODE_QUEUES
+    for queue in transcode_queues:
+        if duration and queue["max_duration"] and duration <= queue["max_duration"]:
+            return queue["name"]
+    return transcode_queues[-1]["name"]
+
+
+def transcode_timeout(duration):
+    """
+    This function returns the timeout in seconds of a job that transcodes the given duration in seconds.
+    """
+    if not duration:
+        return settings.TRANSCODE_TIMEOUT_MAX
+    return min(
+        int(settings.TRANSCODE_TIMEOUT_BASE + duration * settings.TRANSCODE_TIMEOUT_FACTOR),
+        settings.TRANSCODE_TIMEOUT_MAX,
+    )
+
+
 def convert(video_id):
     """
-    This function converts a video file into the desired HLS files. It is called as a signal so it can run in the background.
+    This function converts a video file into all HLS files and the storyboard in one run of FFmpeg.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    if not is_probed(video_instance):
+        probe_video(video_instance, source_path)
+    if reuse_conversion(video_instance, source_path, base_name, output_dir):
+        return
+    resolutions = select_renditions(video_instance)
+    pending_resolutions = {
+        suffix: rung
+        for suffix, rung in resolutions.items()
+        if not rendition_is_done(video_instance, suffix)
+    }
+    storyboard_prefix = None
+    if not storyboard_is_done(video_instance):
+        storyboard_prefix = os.path.join(output_dir, f"{base_name}_storyboard")
+    release_db_connection()
+
+    if pending_resolutions:
+        for suffix in pending_resolutions:
+            delete_rendition_files(output_dir, f"{base_name}_{suffix}")
+        if storyboard_prefix:
+            delete_rendition_files(output_dir, f"{base_name}_storyboard")
+        start_progress(video_id, pending_resolutions)
+        m3u8_files = convert_to_hls_ladder(
+            source_path,
+            base_name,
+            output_dir,
+            pending_resolutions,
+            storyboard_prefix=storyboard_prefix,
+            on_progress=progress_publisher(video_id, pending_resolutions, video_instance.duration),
+        )
+        for m3u8_path in m3u8_files.values():
+            check_rendition(m3u8_path, video_instance.duration)
+        save_renditions(video_id, pending_resolutions, m3u8_files)
+        if storyboard_prefix:
+            save_storyboard(video_id, storyboard_prefix, video_instance.duration)
+    elif storyboard_prefix:
+        create_storyboard(video_id)
+
+    save_master_playlist(video_id, output_dir, base_name, resolutions)
+
+
+def queue_renditions(video_id):
+    """
+    This function queues one job for every rendition and the storyboard of a video and a finalize job after them.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    if not is_probed(video_instance):
+        probe_video(video_instance, source_path)
+    if reuse_conversion(video_instance, source_path, base_name, output_dir):
+        return
+
+    resolutions = select_renditions(video_instance)
+    start_progress(video_id, resolutions)
+
+    queue = get_queue(transcode_queue(video_instance.duration))
+    job_timeout = transcode_timeout(video_instance.duration)
+    rendition_jobs = [
+        queue.enqueue(convert_rendition, video_id, suffix, job_timeout=job_timeout, retry=Retry(max=2))
+        for suffix in resolutions
+    ]
+    queue.enqueue(create_storyboard, video_id, job_timeout=job_timeout, retry=Retry(max=2))
+    queue.enqueue(finalize_conversion, video_id, depends_on=rendition_jobs)
+
+
+def convert_rendition(video_id, suffix):
+    """
+    This function creates and saves the HLS files for one resolution or audio track of a video.
     """
     video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    rung = select_renditions(video_instance)[suffix]
+    if rendition_is_done(video_instance, suffix):
+        return video_instance.renditions.get(name=suffix).playlist.name
+    release_db_connection()
+
+    hls_prefix = os.path.join(output_dir, f"{base_name}_{suffix}")
+    delete_rendition_files(output_dir, f"{base_name}_{suffix}")
+    m3u8_path = convert_to_hls(
+        source_path,
+        hls_prefix,
+        rung,
+        on_progress=progress_publisher(video_id, [suffix], video_instance.duration),
+    )
+    check_rendition(m3u8_path, video_instance.duration)
+
+    save_renditions(video_id, {suffix: rung}, {suffix: m3u8_path})
+    return os.path.relpath(m3u8_path, settings.MEDIA_ROOT)
+
+
+def finalize_conversion(video_id):
+    """
+    This function runs after all resolution jobs of a video have finished. It writes the master playlist and saves it on the video.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+
+    save_master_playlist(video_id, output_dir, base_name, select_renditions(video_instance))
+
+
+def split_into_chunks(video_id):
+    """
+    This function splits the source of a video into chunks and queues a job for every chunk and a join job after them.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    if not is_probed(video_instance):
+        probe_video(video_instance, source_path)
+    if reuse_conversion(video_instance, source_path, base_name, output_dir):
+        return
+    chunk_dir = os.path.join(output_dir, "chunks")
+    chunk_seconds = getattr(settings, "TRANSCODE_CHUNK_SECONDS", 120)
+    chunks = split_source(source_path, chunk_dir, chunk_seconds)
+    start_progress(video_id, [f"chunk_{chunk_index:03d}" for chunk_index in range(len(chunks))])
+
+    queue = get_queue(transcode_queue(video_instance.duration))
+    chunk_jobs = [
+        queue.enqueue(
+            convert_chunk, video_id, chunk_index, start, end, job_timeout=transcode_timeout(end - start), retry=Retry(max=2)
+        )
+        for chunk_index, (start, end) in enumerate(chunks)
+    ]
+    queue.enqueue(create_storyboard, video_id, job_timeout=transcode_timeout(video_instance.duration), retry=Retry(max=2))
+    queue.enqueue(join_chunks, video_id, len(chunks), depends_on=chunk_jobs)
+
+
+def convert_chunk(video_id, chunk_index, start, end):
+    """
+    This function converts one chunk of a video into all resolutions and audio tracks.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    chunk_source = os.path.join(output_dir, "chunks", f"chunk_{chunk_index:03d}.mkv")
+    chunk_name = f"{base_name}_c{chunk_index:03d}"
+    resolutions = select_renditions(video_instance)
+    release_db_connection()
+
+    if all(
+        verify_rendition(os.path.join(output_dir, f"{chunk_name}_{suffix}.m3u8"))
+        for suffix in resolutions
+    ):
+        return
+
+    for suffix in resolutions:
+        delete_rendition_files(output_dir, f"{chunk_name}_{suffix}")
+    m3u8_files = convert_to_hls_ladder(
+        to_wsl_path(chunk_source),
+        chunk_name,
+        output_dir,
+        resolutions,
+        ts_offset=start,
+        on_progress=progress_publisher(video_id, [f"chunk_{chunk_index:03d}"], end - start),
+    )
+    for m3u8_path in m3u8_files.values():
+        check_rendition(m3u8_path)
+
+
+def join_chunks(video_id, chunk_count):
+    """
+    This function joins the playlists of the chunks of a video and saves them with the master playlist.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    resolutions = select_renditions(video_instance)
+
+    for suffix, rung in resolutions.items():
+        if rendition_is_done(video_instance, suffix):
+            continue
+
+        chunk_playlists = [
+            os.path.join(output_dir, f"{base_name}_c{chunk_index:03d}_{suffix}.m3u8")
+            for chunk_index in range(chunk_count)
+        ]
+        m3u8_path = os.path.join(output_dir, f"{base_name}_{suffix}.m3u8")
+        join_playlists(chunk_playlists, m3u8_path)
+        check_rendition(m3u8_path, video_instance.duration)
+        save_renditions(video_id, {suffix: rung}, {suffix: m3u8_path})
+
+        for chunk_playlist in chunk_playlists:
+            os.remove(chunk_playlist)
+
+    shutil.rmtree(os.path.join(output_dir, "chunks"), ignore_errors=True)
+    save_master_playlist(video_id, output_dir, base_name, resolutions)
+
+
+def create_storyboard(video_id):
+    """
+    This function creates the storyboard of a video in its own run of FFmpeg and saves it.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    if storyboard_is_done(video_instance):
+        return
+    source_path, base_name, output_dir = prepare_conversion(video_instance)
+    release_db_connection()
+
+    storyboard_prefix = os.path.join(output_dir, f"{base_name}_storyboard")
+    delete_rendition_files(output_dir, f"{base_name}_storyboard")
+    convert_to_storyboard(source_path, storyboard_prefix)
+    save_storyboard(video_id, storyboard_prefix, video_instance.duration)
+
+
+def storyboard_is_done(video_instance):
+    """
+    This function checks if the storyboard of a video was created by an earlier run.
+    """
+    storyboard = video_instance.storyboard
+    return bool(storyboard) and os.path.exists(os.path.join(settings.MEDIA_ROOT, storyboard.name))
+
+
+def save_master_playlist(video_id, output_dir, base_name, resolutions):
+    """
+    This function writes the master playlist and saves it on the video with the fingerprint of the encoding settings.
+    """
+    master_path = write_master_playlist(output_dir, base_name, resolutions)
+    Video.objects.filter(id=video_id).update(
+        hls_master_file=os.path.relpath(master_path, settings.MEDIA_ROOT),
+        ladder_fingerprint=ladder_fingerprint(),
+    )
+    bump_content_version("catalog")
+
+
+def save_storyboard(video_id, storyboard_prefix, duration):
+    """
+    This function writes the WebVTT index of the sprites of a storyboard and saves it on the video.
+    """
+    vtt_path = write_storyboard_vtt(storyboard_prefix, duration)
+    Video.objects.filter(id=video_id).update(storyboard=os.path.relpath(vtt_path, settings.MEDIA_ROOT))
+    bump_content_version("catalog")
+
+
+def rendition_is_done(video_instance, suffix):
+    """
+    This function checks if a rung of a video was finished by an earlier run. The rendition has to be saved on the video and the HLS files on the disk have to be complete.
+    """
+    rendition = video_instance.renditions.filter(name=suffix).first()
+    if not rendition:
+        return False
+    return verify_rendition(os.path.join(settings.MEDIA_ROOT, rendition.playlist.name), video_instance.duration)
+
+
+def verify_rendition(m3u8_path, expected_duration=None):
+    """
+    This function checks if the playlist and the segments of a rendition are complete.
+    """
+    if not os.path.exists(m3u8_path):
+        return False
+    with open(m3u8_path) as file:
+        if "#EXT-X-ENDLIST" not in file.read():
+            return False
+
+    segments = read_segments(m3u8_path)
+    if not segments:
+        return False
+
+    output_dir = os.path.dirname(m3u8_path)
+    required_sizes = {}
+    for duration, uri, byterange in segments + read_maps(m3u8_path):
+        length, offset = byterange or (1, 0)
+        required_sizes[uri] = max(required_sizes.get(uri, 0), offset + length)
+    for uri, required_size in required_sizes.items():
+        segment_path = os.path.join(output_dir, uri)
+        if not os.path.exists(segment_path) or os.path.getsize(segment_path) < required_size:
+            return False
+
+    if expected_duration:
+        segments_duration = sum(duration for duration, uri, byterange in segments)
+        if abs(segments_duration - expected_duration) > max(2, expected_duration * 0.02):
+            return False
+    return True
+
+
+def save_renditions(video_id, resolutions, m3u8_files):
+    """
+    This function saves the given rungs and audio tracks of a video as renditions.
+    """
+    for suffix, m3u8_path in m3u8_files.items():
+        rung = resolutions[suffix]
+        Rendition.objects.update_or_create(
+            video_id=video_id,
+            name=suffix,
+            defaults={
+                "media_type": "audio" if is_audio_track(rung) else "video",
+                "resolution": "" if is_audio_track(rung) else rung["resolution"],
+                "height": 0 if is_audio_track(rung) else rung_height(rung),
+                "playlist": os.path.relpath(m3u8_path, settings.MEDIA_ROOT),
+                **describe_rendition(m3u8_path),
+            },
+        )
+    bump_content_version("catalog")
+
+
+def describe_rendition(m3u8_path):
+    """
+    This function reads the bandwidth, codecs, size and segment count of the HLS files of a rendition from the disk.
+    """
+    output_dir = os.path.dirname(m3u8_path)
+    segments = read_segments(m3u8_path) if os.path.exists(m3u8_path) else []
+    if not segments:
+        return {"bandwidth": 0, "average_bandwidth": 0, "codecs": "", "size": 0, "segment_count": 0}
+
+    average_bandwidth, peak_bandwidth = measure_bandwidth(output_dir, segments)
+    return {
+        "bandwidth": peak_bandwidth,
+        "average_bandwidth": average_bandwidth,
+        "codecs": probe_codecs(os.path.join(output_dir, segments[0][1])),
+        "size": sum(os.path.getsize(os.path.join(output_dir, uri)) for uri in {uri for duration, uri, byterange in segments}),
+        "segment_count": len(segments),
+    }
+
+
+def check_rendition(m3u8_path, expected_duration=None):
+    """
+    This function raises an error if the HLS files of a rendition are incomplete, so the job fails and can be retried.
+    """
+    if not verify_rendition(m3u8_path, expected_duration):
+        raise RuntimeError(f"The HLS files of {m3u8_path} are incomplete.")
+
+
+def delete_rendition_files(output_dir, hls_prefix):
+    """
+    This function deletes the playlist and the segments that an interrupted run left behind for a rendition or the storyboard, so the next run starts clean.
+    """
+    pattern = re.compile(re.escape(hls_prefix) + r"(\.m3u8(\.tmp)?|_\d+\.(ts|mp4)|\.mp4|_\d+\.jpg|\.vtt)")
+    for file_name in os.listdir(output_dir):
+        if pattern.fullmatch(file_name):
+            os.remove(os.path.join(output_dir, file_name))
+
+
+def prepare_conversion(video_instance):
+    """
+    This function returns the source path, the base name of the HLS files and the output directory of a video.
+    """
     source_path = to_wsl_path(video_instance.video_file.path)
     folder_path = video_instance.title.replace(" ", "_")
     base_name = os.path.splitext(os.path.basename(video_instance.video_file.name))[0]
     output_dir = create_output_directory(folder_path)
+    return source_path, base_name, output_dir
+
+
+def probe_video(video_instance, source_path):
+    """
+    This function saves the duration, resolution, bitrate and codecs of the source on the video.
+    """
+    metadata = probe_source(source_path)
+    for field_name, value in metadata.items():
+        setattr(video_instance, field_name, value)
+    Video.objects.filter(id=video_instance.id).update(**metadata)
+    return metadata
+
+
+def is_probed(video_instance):
+    """
+    This function checks if the source of a video was already probed, for example by the job that routed the conversion.
+    """
+    return video_instance.duration is not None and video_instance.height is not None
+
+
+def reuse_conversion(video_instance, source_path, base_name, output_dir):
+    """
+    This function links the renditions of a finished video with the same source and settings and returns True if there is one.
+    """
+    source_hash = hash_source(video_instance, source_path)
+    resolutions = select_renditions(video_instance)
+    originals = (
+        Video.objects.filter(source_hash=source_hash, ladder_fingerprint=ladder_fingerprint())
+        .exclude(id=video_instance.id)
+        .exclude(hls_master_file__isnull=True)
+        .exclude(hls_master_file="")
+    )
+    for original in originals:
+        renditions = {rendition.name: rendition for rendition in original.renditions.all()}
+        if not all(
+            suffix in renditions
+            and verify_rendition(os.path.join(settings.MEDIA_ROOT, renditions[suffix].playlist.name))
+            for suffix in resolutions
+        ):
+            continue
+
+        try:
+            m3u8_files = {}
+            for suffix in resolutions:
+                m3u8_files[suffix] = os.path.join(output_dir, f"{base_name}_{suffix}.m3u8")
+                link_rendition(os.path.join(settings.MEDIA_ROOT, renditions[suffix].playlist.name), m3u8_files[suffix])
+                check_rendition(m3u8_files[suffix], video_instance.duration)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"The renditions of video {original.id} could not be reused for video {video_instance.id}. {e}")
+            continue
+        save_renditions(video_instance.id, resolutions, m3u8_files)
+
+        if storyboard_is_done(original):
+            storyboard_prefix = os.path.join(output_dir, f"{base_name}_storyboard")
+            original_prefix = os.path.splitext(os.path.join(settings.MEDIA_ROOT, original.storyboard.name))[0]
+            try:
+                link_rendition_files(original_prefix, storyboard_prefix)
+                save_storyboard(video_instance.id, storyboard_prefix, video_instance.duration)
+            except OSError as e:
+                logger.warning(f"The storyboard of video {original.id} could not be reused. {e}")
 
-    resolutions = {
-        "360p": ("hls_file_360", "640x360"),
-        "480p": ("hls_file_480", "854x480"),
-        "720p": ("hls_file_720", "1280x720"),
-        "1080p": ("hls_file_1080", "1920x1080"),
+        save_master_playlist(video_instance.id, output_dir, base_name, resolutions)
+        return True
+    return False
+
+
+def hash_source(video_instance, source_path):
+    """
+    This function returns the hash of the source of a video. If it was not hashed during the upload, for example after an upload in the admin, it is hashed now and saved on the video.
+    """
+    if not video_instance.source_hash:
+        video_instance.source_hash = hash_file(source_path)
+        Video.objects.filter(id=video_instance.id).update(source_hash=video_instance.source_hash)
+    return video_instance.source_hash
+
+
+SOURCE_HASH_START = hashlib.sha256().hexdigest()
+
+
+def hash_block(source_hash, block):
+    """
+    This function chains the SHA-256 of the next block of a source to its hash.
+    """
+    return hashlib.sha256(bytes.fromhex(source_hash) + hashlib.sha256(block).digest()).hexdigest()
+
+
+def hash_file(path):
+    """
+    This function returns the hash of a file from its blocks of UPLOAD_BLOCK_SIZE bytes, the same way as it is built during an upload.
+    """
+    source_hash = SOURCE_HASH_START
+    with open(path, "rb") as file:
+        while block := file.read(settings.UPLOAD_BLOCK_SIZE):
+            source_hash = hash_block(source_hash, block)
+    return source_hash
+
+
+def ladder_fingerprint():
+    """
+    This function returns a hash of the settings that decide how the HLS files and the storyboard look. Renditions are only reused between videos with the same fingerprint.
+    """
+    encoding_settings = {
+        "ladder": settings.HLS_LADDER,
+        "segment_seconds": settings.HLS_SEGMENT_SECONDS,
+        "segment_type": settings.HLS_SEGMENT_TYPE,
+        "storyboard": settings.STORYBOARD,
     }
+    return hashlib.sha256(json.dumps(encoding_settings, sort_keys=True).encode()).hexdigest()
 
-    with transaction.atomic():
-        for suffix, (field_name, resolution) in resolutions.items():
-            process_resolution(
-                video_instance,
-                source_path,
-                base_name,
-                output_dir,
-                suffix,
-                field_name,
-                resolution,
-            )
 
-        video_instance.save()
+def link_rendition(source_m3u8_path, m3u8_path):
+    """
+    This function links the files of a rendition under the name of a new playlist and writes the playlist.
+    """
+    if os.path.abspath(source_m3u8_path) == os.path.abspath(m3u8_path):
+        return
+
+    source_dir = os.path.dirname(source_m3u8_path)
+    output_dir = os.path.dirname(m3u8_path)
+    prefix = os.path.splitext(os.path.basename(m3u8_path))[0]
+    uris = []
+    for duration, uri, byterange in read_maps(source_m3u8_path) + read_segments(source_m3u8_path):
+        if uri not in uris:
+            uris.append(uri)
+
+    delete_rendition_files(output_dir, prefix)
+    file_names = {}
+    for index, uri in enumerate(uris):
+        extension = os.path.splitext(uri)[1]
+        file_names[uri] = f"{prefix}{extension}" if len(uris) == 1 and extension == ".mp4" else f"{prefix}_{index:03d}{extension}"
+        link_file(os.path.join(source_dir, uri), os.path.join(output_dir, file_names[uri]))
+
+    with open(source_m3u8_path) as file:
+        lines = [line.strip() for line in file]
+    with open(m3u8_path, "w") as file:
+        for line in lines:
+            if line.startswith("#EXT-X-MAP:"):
+                line = re.sub(r'URI="([^"]*)"', lambda match: f'URI="{file_names[match.group(1)]}"', line)
+            elif line and not line.startswith("#"):
+                line = file_names[line]
+            file.write(line + "\n")
+
+
+def link_rendition_files(source_prefix, prefix):
+    """
+    This function links the sprites of a storyboard under a new prefix.
+    """
+    if os.path.abspath(source_prefix) == os.path.abspath(prefix):
+        return
+
+    delete_rendition_files(os.path.dirname(prefix), os.path.basename(prefix))
+    source_dir = os.path.dirname(source_prefix)
+    pattern = re.compile(re.escape(os.path.basename(source_prefix)) + r"(_\d+\.jpg)")
+    for file_name in os.listdir(source_dir):
+        match = pattern.fullmatch(file_name)
+        if match:
+            link_file(os.path.join(source_dir, file_name), prefix + match.group(1))
+
+
+def link_file(source_path, target_path):
+    """
+    This function hard links a file, so it takes no extra space on the disk. Files on another file system are copied.
+    """
+    if os.path.exists(target_path):
+        if os.path.samefile(source_path, target_path):
+            return
+        os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
+
+def release_db_connection():
+    """
+    This function closes the database connection before a long encode, unless a transaction is open.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def get_ladder():
+    """
+    This function returns the rungs of the HLS_LADDER setting by their name, from the lowest to the highest resolution.
+    """
+    return {rung["name"]: rung for rung in sorted(settings.HLS_LADDER, key=rung_height)}
+
+
+def rung_height(rung):
+    """
+    This function returns the height of a rung in pixels.
+    """
+    return int(rung["resolution"].split("x")[1])
+
+
+def select_resolutions(source_height):
+    """
+    This function returns the rungs of the ladder that are not higher than the source.
+    """
+    ladder = get_ladder()
+    if not source_height:
+        return ladder
+
+    selected_resolutions = {
+        suffix: rung
+        for suffix, rung in ladder.items()
+        if rung_height(rung) <= source_height
+    }
+    if not selected_resolutions:
+        lowest_suffix = next(iter(ladder))
+        selected_resolutions[lowest_suffix] = ladder[lowest_suffix]
+    return selected_resolutions
+
+
+def select_audio_tracks(resolutions, has_audio):
+    """
+    This function returns one audio track for every audio bitrate of the given rungs.
+    """
+    if not has_audio:
+        return {}
+
+    audio_tracks = {}
+    for rung in resolutions.values():
+        track_name = audio_track_name(rung)
+        audio_tracks[track_name] = {
+            "name": track_name,
+            "type": "audio",
+            "audio_bitrate": rung.get("audio_bitrate", "128k"),
+        }
+    return audio_tracks
+
+
+def select_renditions(video_instance):
+    """
+    This function returns the rungs and the audio tracks that are created for a video.
+    """
+    resolutions = select_resolutions(video_instance.height)
+    return {**resolutions, **select_audio_tracks(resolutions, bool(video_instance.audio_codec))}
+
+
+def audio_track_name(rung):
+    """
+    This function returns the name of the audio track that a rung uses.
+    """
+    return f"audio_{rung.get('audio_bitrate', '128k')}"
+
+
+def is_audio_track(rung):
+    """
+    This function checks if a rendition is an audio track and not a rung of the ladder.
+    """
+    return rung.get("type") == "audio"
 
 
 def create_output_directory(sanitized_folder_path):
@@ -58,66 +720,670 @@ def create_output_directory(sanitized_folder_path):
     return output_dir
 
 
-def process_resolution(video_instance, source, base_name, output_dir, suffix, field_name, resolution):
+def probe_source(source):
     """
-    This function starts the process of starts the creation of the the HLS files. In the end it deletes the helper mp4 file.
+    This function uses the FFprobe tool to read the duration, resolution, bitrate and codecs of a video file. FFprobe is stopped after PROBE_TIMEOUT seconds.
     """
-    resolution_file = os.path.join(output_dir, f"{base_name}_{suffix}.mp4")
-    convert_to_resolution(source, resolution_file, resolution)
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        source,
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=settings.PROBE_TIMEOUT)
+    probe = json.loads(result.stdout)
 
-    hls_prefix = os.path.join(output_dir, f"{base_name}_{suffix}")
-    m3u8_path = convert_to_hls(resolution_file, hls_prefix)
+    streams = probe.get("streams", [])
+    video_stream = next((stream for stream in streams if stream.get("codec_type") == "video"), {})
+    audio_stream = next((stream for stream in streams if stream.get("codec_type") == "audio"), {})
+    source_format = probe.get("format", {})
 
-    relative_path = os.path.relpath(m3u8_path, settings.MEDIA_ROOT)
-    setattr(video_instance, field_name, relative_path)
+    return {
+        "duration": float(source_format["duration"]) if "duration" in source_format else None,
+        "width": video_stream.get("width"),
+        "height": video_stream.get("height"),
+        "bitrate": int(source_format["bit_rate"]) if "bit_rate" in source_format else None,
+        "video_codec": video_stream.get("codec_name", ""),
+        "audio_codec": audio_stream.get("codec_name", ""),
+    }
 
-    delete_mp4(resolution_file)
+
+def convert_to_hls(source, output_name_prefix, rung, on_progress=None):
+    """
+    This function uses the FFmpeg tool to encode a video file to one rung of the ladder or an audio track.
+    """
+    m3u8_file = f"{output_name_prefix}.m3u8"
+    if is_audio_track(rung):
+        stream_args = ["-vn", *audio_encoder_args(rung)]
+    else:
+        stream_args = ["-s", rung["resolution"], "-an", *encoder_args(rung)]
+    cmd = [
+        "ffmpeg",
+        "-i", source,
+        *stream_args,
+        *hls_output_args(output_name_prefix),
+    ]
+    run_ffmpeg(cmd, on_progress)
+    return m3u8_file
 
 
-def convert_to_resolution(source, output_name, resolution):
+def convert_to_hls_ladder(
+    source, base_name, output_dir, resolutions, ts_offset=0, storyboard_prefix=None, on_progress=None
+):
     """
-    This function uses the FFmpeg tool to convert a video file to a specified resolution.
+    This function uses the FFmpeg tool to encode all rungs, audio tracks and the storyboard of a source in one run.
     """
+    video_rungs = {suffix: rung for suffix, rung in resolutions.items() if not is_audio_track(rung)}
+    split_count = len(video_rungs) + (1 if storyboard_prefix else 0)
+    filter_graph = [
+        f"[0:v]split={split_count}" + "".join(f"[v{index}]" for index in range(split_count))
+    ]
+    outputs = []
+    m3u8_files = {}
+
+    for index, (suffix, rung) in enumerate(video_rungs.items()):
+        width, height = rung["resolution"].split("x")
+        filter_graph.append(f"[v{index}]scale={width}:{height}[v{index}out]")
+        hls_prefix = os.path.join(output_dir, f"{base_name}_{suffix}")
+        m3u8_files[suffix] = f"{hls_prefix}.m3u8"
+        outputs += [
+            "-map", f"[v{index}out]",
+            *encoder_args(rung),
+            "-output_ts_offset", str(ts_offset),
+            *hls_output_args(hls_prefix),
+        ]
+
+    for suffix, rung in resolutions.items():
+        if not is_audio_track(rung):
+            continue
+        hls_prefix = os.path.join(output_dir, f"{base_name}_{suffix}")
+        m3u8_files[suffix] = f"{hls_prefix}.m3u8"
+        outputs += [
+            "-map", "0:a:0",
+            *audio_encoder_args(rung),
+            "-output_ts_offset", str(ts_offset),
+            *hls_output_args(hls_prefix),
+        ]
+
+    if storyboard_prefix:
+        filter_graph.append(f"[v{len(video_rungs)}]{storyboard_filter()}[storyboard]")
+        outputs += ["-map", "[storyboard]", *storyboard_output_args(storyboard_prefix)]
+
     cmd = [
         "ffmpeg",
         "-i", source,
-        "-s", resolution,
-        "-c:v", "libx264",
-        "-crf", "23",
-        "-c:a", "aac",
-        "-strict", "-2",
-        to_wsl_path(output_name),
+        *(["-filter_complex", ";".join(filter_graph)] if split_count else []),
+        *outputs,
     ]
-    subprocess.run(cmd, check=True)
+    run_ffmpeg(cmd, on_progress)
+    return m3u8_files
 
 
-def convert_to_hls(source, output_name_prefix):
+def convert_to_storyboard(source, storyboard_prefix):
     """
-    This function converts an input file to a specified HLS file.
+    This function uses the FFmpeg tool to write the sprites of the storyboard of a video file.
     """
-    m3u8_file = f"{output_name_prefix}.m3u8"
-    segment_pattern = f"{output_name_prefix}_%03d.ts"
     cmd = [
         "ffmpeg",
         "-i", source,
-        "-codec", "copy",
+        "-vf", storyboard_filter(),
+        *storyboard_output_args(storyboard_prefix),
+    ]
+    run_ffmpeg(cmd)
+
+
+def storyboard_filter():
+    """
+    This function returns the FFmpeg filter that puts a thumbnail of every interval into the sprites of a storyboard.
+    """
+    storyboard = settings.STORYBOARD
+    width, height = storyboard["tile_width"], storyboard["tile_height"]
+    return (
+        f"fps=1/{storyboard['interval']}:eof_action=pass,"
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+        f"tile={storyboard['columns']}x{storyboard['rows']}"
+    )
+
+
+def storyboard_output_args(storyboard_prefix):
+    """
+    This function returns the FFmpeg output options for the sprites of a storyboard.
+    """
+    return [
+        "-q:v", "5",
         "-start_number", "0",
-        "-hls_time", "10",
+        "-f", "image2",
+        to_wsl_path(f"{storyboard_prefix}_%03d.jpg"),
+    ]
+
+
+def write_storyboard_vtt(storyboard_prefix, duration):
+    """
+    This function writes the WebVTT index of a storyboard and returns its path.
+    """
+    storyboard = settings.STORYBOARD
+    interval = storyboard["interval"]
+    tiles_per_sprite = storyboard["columns"] * storyboard["rows"]
+    output_dir = os.path.dirname(storyboard_prefix)
+    sprite_name = os.path.basename(storyboard_prefix)
+    if not duration:
+        sprite_count = len([
+            file_name for file_name in os.listdir(output_dir)
+            if re.fullmatch(re.escape(sprite_name) + r"_\d+\.jpg", file_name)
+        ])
+        duration = sprite_count * tiles_per_sprite * interval
+
+    lines = ["WEBVTT", ""]
+    for index in range(math.ceil(duration / interval)):
+        start = index * interval
+        end = min(start + interval, duration)
+        tile = index % tiles_per_sprite
+        x = tile % storyboard["columns"] * storyboard["tile_width"]
+        y = tile // storyboard["columns"] * storyboard["tile_height"]
+        lines += [
+            f"{format_vtt_time(start)} --> {format_vtt_time(end)}",
+            f"{sprite_name}_{index // tiles_per_sprite:03d}.jpg"
+            f"#xywh={x},{y},{storyboard['tile_width']},{storyboard['tile_height']}",
+            "",
+        ]
+
+    vtt_path = f"{storyboard_prefix}.vtt"
+    with open(vtt_path, "w") as file:
+        file.write("\n".join(lines))
+    return vtt_path
+
+
+def format_vtt_time(seconds):
+    """
+    This function formats seconds as a WebVTT timestamp, for example "00:01:05.500".
+    """
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def run_ffmpeg(cmd, on_progress=None):
+    """
+    This function runs a FFmpeg command and passes its progress reports to on_progress.
+    """
+    if on_progress is None:
+        subprocess.run(cmd, check=True)
+        return
+
+    process = subprocess.Popen(
+        [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    report = {}
+    progress_failed = False
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            report[key] = value
+            if key == "progress":
+                try:
+                    on_progress(report)
+                except Exception as e:
+                    if not progress_failed:
+                        logger.warning(f"The progress of FFmpeg could not be published. {e}")
+                    progress_failed = True
+                report = {}
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        process.stdout.close()
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def start_progress(video_id, labels):
+    """
+    This function resets the progress of a conversion and registers its parts, for example the resolutions or the chunks, so their progress can be read together.
+    """
+    labels = list(labels)
+    cache.delete_many([f"transcode_progress_{video_id}_{label}" for label in labels])
+    cache.set(f"transcode_progress_{video_id}", labels, PROGRESS_TIMEOUT)
+
+
+def progress_publisher(video_id, labels, duration):
+    """
+    This function returns a callback for run_ffmpeg that publishes the progress of an encode to Redis.
+    """
+    last_percent = 0
+
+    def publish(report):
+        nonlocal last_percent
+        out_time = parse_progress_value(report.get("out_time_us")) / 1_000_000
+        done = report.get("progress") == "end"
+        percent = 100 if done else min(100 * out_time / duration, 99.9) if duration else 0
+        last_percent = max(last_percent, percent)
+        state = {
+            "percent": round(last_percent, 1),
+            "fps": parse_progress_value(report.get("fps")),
+            "speed": parse_progress_value(report.get("speed", "").rstrip("x")),
+            "done": done,
+        }
+        cache.set_many(
+            {f"transcode_progress_{video_id}_{label}": state for label in labels},
+            PROGRESS_TIMEOUT,
+        )
+
+    return publish
+
+
+def parse_progress_value(value):
+    """
+    This function converts a value of a FFmpeg progress report to a number. Values that are not available yet are returned as 0.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def split_source(source, chunk_dir, chunk_seconds):
+    """
+    This function uses the FFmpeg tool to copy the source into chunks and returns their start and end times.
+    """
+    os.makedirs(chunk_dir, exist_ok=True)
+    chunk_list = os.path.join(chunk_dir, "chunks.csv")
+    cmd = [
+        "ffmpeg",
+        "-i", source,
+        "-map", "0:v:0",
+        "-map", "0:a?",
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_time", str(chunk_seconds),
+        "-reset_timestamps", "1",
+        "-segment_list", to_wsl_path(chunk_list),
+        "-segment_list_type", "csv",
+        to_wsl_path(os.path.join(chunk_dir, "chunk_%03d.mkv")),
+    ]
+    subprocess.run(cmd, check=True)
+
+    with open(chunk_list) as file:
+        return [
+            (float(line.split(",")[1]), float(line.split(",")[2]))
+            for line in file
+            if line.strip()
+        ]
+
+
+def join_playlists(playlists, output_path):
+    """
+    This function joins HLS playlists into one continuous playlist.
+    """
+    entries = []
+    durations = []
+    current_map = None
+    for playlist in playlists:
+        maps = read_maps(playlist)
+        if maps and maps[0] != current_map:
+            if current_map:
+                entries.append("#EXT-X-DISCONTINUITY")
+            current_map = maps[0]
+            entries.append(format_map(current_map))
+        for duration, uri, byterange in read_segments(playlist):
+            durations.append(duration)
+            entries.append(f"#EXTINF:{duration:.6f},")
+            if byterange:
+                entries.append(f"#EXT-X-BYTERANGE:{byterange[0]}@{byterange[1]}")
+            entries.append(uri)
+
+    target_duration = max((math.ceil(duration) for duration in durations), default=10)
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7" if current_map else "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        *entries,
+        "#EXT-X-ENDLIST",
+    ]
+
+    with open(output_path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def read_segments(playlist):
+    """
+    This function returns the duration, uri and byte range of every segment of a HLS playlist.
+    """
+    with open(playlist) as file:
+        lines = [line.strip() for line in file if line.strip()]
+
+    segments = []
+    byterange = None
+    next_offsets = {}
+    for line in lines:
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            byterange = line[len("#EXT-X-BYTERANGE:"):]
+        elif not line.startswith("#"):
+            if byterange:
+                byterange = parse_byterange(byterange, next_offsets.get(line, 0))
+                next_offsets[line] = byterange[1] + byterange[0]
+            segments.append((duration, line, byterange))
+            byterange = None
+    return segments
+
+
+def read_maps(playlist):
+    """
+    This function reads the initialization sections of a fMP4 HLS playlist and returns them like segments with a duration of 0. TS playlists have none.
+    """
+    with open(playlist) as file:
+        lines = [line.strip() for line in file if line.startswith("#EXT-X-MAP:")]
+
+    maps = []
+    for line in lines:
+        uri = re.search(r'URI="([^"]*)"', line).group(1)
+        byterange = re.search(r'BYTERANGE="([^"]*)"', line)
+        maps.append((0, uri, parse_byterange(byterange.group(1)) if byterange else None))
+    return maps
+
+
+def format_map(initialization_section):
+    """
+    This function writes an initialization section as returned by read_maps back as a playlist tag.
+    """
+    duration, uri, byterange = initialization_section
+    if byterange:
+        return f'#EXT-X-MAP:URI="{uri}",BYTERANGE="{byterange[0]}@{byterange[1]}"'
+    return f'#EXT-X-MAP:URI="{uri}"'
+
+
+def parse_byterange(value, default_offset=0):
+    """
+    This function converts a HLS byte range like "1000@500" to a tuple of length and offset. If the offset is missing, the range starts at default_offset.
+    """
+    length, _, offset = value.partition("@")
+    return int(length), int(offset) if offset else default_offset
+
+
+def write_master_playlist(output_dir, base_name, resolutions):
+    """
+    This function writes the HLS master playlist with a variant for every resolution and returns its path.
+    """
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    audio_descriptions = {}
+    for suffix, rung in resolutions.items():
+        if not is_audio_track(rung):
+            continue
+        m3u8_name = f"{base_name}_{suffix}.m3u8"
+        description = describe_rendition(os.path.join(output_dir, m3u8_name))
+        if not description["segment_count"]:
+            continue
+
+        audio_descriptions[suffix] = description
+        lines.append(
+            f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{suffix}",NAME="Audio",DEFAULT=YES,AUTOSELECT=YES,URI="{m3u8_name}"'
+        )
+
+    for suffix, rung in resolutions.items():
+        if is_audio_track(rung):
+            continue
+        m3u8_name = f"{base_name}_{suffix}.m3u8"
+        description = describe_rendition(os.path.join(output_dir, m3u8_name))
+        if not description["segment_count"]:
+            continue
+
+        bandwidth = description["bandwidth"]
+        average_bandwidth = description["average_bandwidth"]
+        codecs = description["codecs"]
+        audio_group = ""
+        audio_description = audio_descriptions.get(audio_track_name(rung))
+        if audio_description:
+            bandwidth += audio_description["bandwidth"]
+            average_bandwidth += audio_description["average_bandwidth"]
+            codecs = f'{codecs},{audio_description["codecs"]}'
+            audio_group = f',AUDIO="{audio_track_name(rung)}"'
+        lines += [
+            f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},AVERAGE-BANDWIDTH={average_bandwidth},"
+            f'RESOLUTION={rung["resolution"]},CODECS="{codecs}"{audio_group}',
+            m3u8_name,
+        ]
+
+    master_path = os.path.join(output_dir, f"{base_name}_master.m3u8")
+    with open(master_path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    return master_path
+
+
+def measure_bandwidth(output_dir, segments):
+    """
+    This function returns the average and the peak bitrate of a playlist in bits per second.
+    """
+    total_bits = 0
+    total_duration = 0
+    peak_bandwidth = 0
+
+    for duration, uri, byterange in segments:
+        bits = (byterange[0] if byterange else os.path.getsize(os.path.join(output_dir, uri))) * 8
+        total_bits += bits
+        total_duration += duration
+        if duration >= 1:
+            peak_bandwidth = max(peak_bandwidth, bits / duration)
+
+    average_bandwidth = total_bits / total_duration if total_duration else 0
+    return int(average_bandwidth), int(max(peak_bandwidth, average_bandwidth))
+
+
+AVC_PROFILES = {
+    "Constrained Baseline": (66, 0xE0),
+    "Baseline": (66, 0x00),
+    "Main": (77, 0x00),
+    "High": (100, 0x00),
+}
+
+
+def probe_codecs(media_file):
+    """
+    This function uses the FFprobe tool to read the codecs of a media file and returns them in the format that HLS playlists use, for example "avc1.64001f,mp4a.40.2".
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-print_format", "json",
+        "-show_streams",
+        media_file,
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=settings.PROBE_TIMEOUT)
+
+    codecs = []
+    for stream in json.loads(result.stdout).get("streams", []):
+        if stream.get("codec_name") == "h264":
+            profile_idc, constraints = AVC_PROFILES.get(stream.get("profile"), AVC_PROFILES["High"])
+            codecs.append(f"avc1.{profile_idc:02x}{constraints:02x}{stream.get('level', 40):02x}")
+        elif stream.get("codec_name") == "aac":
+            codecs.append("mp4a.40.5" if stream.get("profile") == "HE-AAC" else "mp4a.40.2")
+    return ",".join(codecs)
+
+
+def encoder_args(rung):
+    """
+    This function returns the FFmpeg video codec options of a rung.
+    """
+    args = ["-c:v", "libx264", "-preset", rung.get("preset", "medium")]
+    if "bitrate" in rung:
+        args += ["-b:v", rung["bitrate"]]
+    else:
+        args += ["-crf", str(rung.get("crf", 23))]
+    if "maxrate" in rung:
+        args += ["-maxrate", rung["maxrate"], "-bufsize", rung.get("bufsize", rung["maxrate"])]
+
+    gop = rung.get("gop", settings.HLS_SEGMENT_SECONDS)
+    return args + ["-force_key_frames", f"expr:gte(t,n_forced*{gop})"]
+
+
+def audio_encoder_args(rung):
+    """
+    This function returns the FFmpeg audio codec options of an audio track.
+    """
+    return ["-c:a", "aac", "-b:a", rung.get("audio_bitrate", "128k")]
+
+
+def hls_output_args(output_name_prefix):
+    """
+    This function returns the FFmpeg output options for a HLS playlist of HLS_SEGMENT_TYPE.
+    """
+    m3u8_file = f"{output_name_prefix}.m3u8"
+    if settings.HLS_SEGMENT_TYPE == "mpegts":
+        segment_args = ["-hls_segment_filename", to_wsl_path(f"{output_name_prefix}_%03d.ts")]
+    else:
+        segment_args = [
+            "-hls_segment_type", "fmp4",
+            "-hls_flags", "single_file",
+            "-hls_segment_filename", to_wsl_path(f"{output_name_prefix}.mp4"),
+        ]
+    return [
+        "-start_number", "0",
+        "-hls_time", str(settings.HLS_SEGMENT_SECONDS),
         "-hls_list_size", "0",
         "-f", "hls",
-        "-hls_segment_filename", to_wsl_path(segment_pattern),
+        *segment_args,
         to_wsl_path(m3u8_file),
     ]
-    subprocess.run(cmd, check=True)
-    return m3u8_file
 
 
-def delete_mp4(resolution_file):
+def enqueue_thumbnail_variants(video_id):
+    """
+    This function queues the creation of the smaller variants of a thumbnail.
+    """
+    queue = get_queue("background")
+    queue.enqueue(create_thumbnail_variants, video_id, retry=Retry(max=2))
+
+
+def create_thumbnail_variants(video_id):
+    """
+    This function uses Pillow to save the thumbnail of a video as WebP and JPEG in every width of THUMBNAIL_WIDTHS.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    thumbnail_name = video_instance.thumbnail.name
+    thumbnail_path = os.path.join(settings.MEDIA_ROOT, thumbnail_name)
+    base_name = os.path.splitext(thumbnail_name)[0]
+
+    variants = {"source": thumbnail_name, "webp": {}, "jpeg": {}}
+    with Image.open(thumbnail_path) as image:
+        image = image.convert("RGB")
+        widths = [width for width in settings.THUMBNAIL_WIDTHS if width < image.width] or [image.width]
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized_image = image.resize((width, height), Image.LANCZOS)
+            resized_image.save(
+                os.path.join(settings.MEDIA_ROOT, f"{base_name}_{width}.webp"), "WEBP", quality=80, method=6
+            )
+            resized_image.save(
+                os.path.join(settings.MEDIA_ROOT, f"{base_name}_{width}.jpg"),
+                "JPEG",
+                quality=80,
+                optimize=True,
+                progressive=True,
+            )
+            variants["webp"][str(width)] = f"{base_name}_{width}.webp"
+            variants["jpeg"][str(width)] = f"{base_name}_{width}.jpg"
+
+    Video.objects.filter(id=video_id).update(thumbnail_variants=variants)
+    bump_content_version("catalog")
+
+
+def enqueue_teaser_optimization(video_id):
     """
-    This function deletes the mp4 file that is created for creating the HLS files.
+    This function queues the optimization of the teaser of a video. Teasers are short, so they go to the queue for short sources.
     """
-    if os.path.exists(resolution_file):
-        os.remove(resolution_file)
+    queue = get_queue(transcode_queue(settings.TEASER["max_seconds"]))
+    queue.enqueue(
+        optimize_teaser, video_id, job_timeout=transcode_timeout(settings.TEASER["max_seconds"]), retry=Retry(max=2)
+    )
+
+
+def optimize_teaser(video_id):
+    """
+    This function re-encodes the uploaded teaser of a video into a short MP4 and, if TEASER has HLS resolutions, a small HLS ladder in the public teaser folder of the video.
+    """
+    video_instance = Video.objects.get(id=video_id)
+    teaser_path = to_wsl_path(video_instance.teaser.path)
+    optimized_name = optimized_teaser_name(video_instance)
+    optimized_path = os.path.join(settings.MEDIA_ROOT, optimized_name)
+    folder_path = video_instance.title.replace(" ", "_")
+    release_db_connection()
+
+    os.makedirs(os.path.dirname(optimized_path), exist_ok=True)
+    convert_teaser(teaser_path, optimized_path)
+    teaser_fields = {"teaser_optimized": optimized_name}
+
+    hls_resolutions = settings.TEASER.get("hls_resolutions", [])
+    if hls_resolutions:
+        metadata = probe_source(optimized_path)
+        ladder = get_ladder()
+        unknown_resolutions = [suffix for suffix in hls_resolutions if suffix not in ladder]
+        if unknown_resolutions:
+            logger.warning(f"The TEASER hls_resolutions {unknown_resolutions} are not rungs of HLS_LADDER.")
+        lowest_suffix = next(iter(ladder))
+        resolutions = {
+            suffix: ladder[suffix]
+            for suffix in hls_resolutions
+            if suffix in ladder and rung_height(ladder[suffix]) <= (metadata["height"] or 0)
+        } or {lowest_suffix: ladder[lowest_suffix]}
+        resolutions.update(select_audio_tracks(resolutions, bool(metadata["audio_codec"])))
+
+        output_dir = create_output_directory(os.path.join(folder_path, "teaser"))
+        base_name = os.path.splitext(os.path.basename(optimized_name))[0]
+        convert_to_hls_ladder(optimized_path, base_name, output_dir, resolutions)
+        master_path = write_master_playlist(output_dir, base_name, resolutions)
+        teaser_fields["teaser_hls_file"] = os.path.relpath(master_path, settings.MEDIA_ROOT)
+
+    Video.objects.filter(id=video_id).update(**teaser_fields)
+    bump_content_version("catalog")
+
+
+def optimized_teaser_name(video_instance):
+    """
+    This function returns the name of the optimized teaser of a video in its public teaser folder.
+    """
+    title_path = video_instance.title.replace(" ", "_")
+    teaser_stem = os.path.splitext(os.path.basename(video_instance.teaser.name))[0]
+    return os.path.join("videos", title_path, "teaser", f"{teaser_stem}_optimized.mp4")
+
+
+def convert_teaser(source, output_path):
+    """
+    This function uses the FFmpeg tool to encode a teaser into a short MP4 that starts playing while it loads.
+    """
+    teaser = settings.TEASER
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i", source,
+        "-t", str(teaser["max_seconds"]),
+        "-vf", f"scale=-2:'min({teaser['height']},ih)'",
+        "-c:v", "libx264",
+        "-preset", teaser.get("preset", "slow"),
+        "-crf", str(teaser["crf"]),
+        "-maxrate", teaser["maxrate"],
+        "-bufsize", teaser["bufsize"],
+        "-profile:v", "main",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-b:a", teaser["audio_bitrate"],
+        "-movflags", "+faststart",
+        to_wsl_path(output_path),
+    ]
+    run_ffmpeg(cmd)
 
 
 def delete_video_folder(folder_path):
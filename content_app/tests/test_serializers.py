@@ -2,6 +2,9 @@ from rest_framework.test import APITestCase
 from datetime import date
 from content_app.serializers import DashboardVideoSerializer
 from content_app.serializers import HeroVideoSerializer
+from content_app.serializers import VideoSerializer
+from content_app.models import Rendition, Video
+from unittest.mock import patch
 
 
 class DashboardSerializerTests(APITestCase):
@@ -14,9 +17,30 @@ class DashboardSerializerTests(APITestCase):
         }
 
     def test_contains_expected_fields(self):
-        serializer = DashboardVideoSerializer(instance=self.dashboard_data)
+        serializer = DashboardVideoSerializer(instance=Video(**self.dashboard_data))
         data = serializer.data
-        self.assertEqual(set(data.keys()), set(["created_at", "category", "thumbnail"]))
+        self.assertEqual(
+            set(data.keys()), set(["id", "created_at", "category", "thumbnail", "thumbnail_srcset"])
+        )
+
+    def test_thumbnail_srcset(self):
+        video = Video(
+            **self.dashboard_data,
+            thumbnail_variants={
+                "source": "thumbnails/Video/thumbnail.jpg",
+                "webp": {"320": "thumbnails/Video/thumbnail_320.webp", "640": "thumbnails/Video/thumbnail_640.webp"},
+                "jpeg": {"320": "thumbnails/Video/thumbnail_320.jpg", "640": "thumbnails/Video/thumbnail_640.jpg"},
+            },
+        )
+        data = DashboardVideoSerializer(instance=video).data
+        self.assertEqual(
+            data["thumbnail_srcset"]["webp"],
+            "/media/thumbnails/Video/thumbnail_320.webp 320w, /media/thumbnails/Video/thumbnail_640.webp 640w",
+        )
+        self.assertEqual(
+            data["thumbnail_srcset"]["jpeg"],
+            "/media/thumbnails/Video/thumbnail_320.jpg 320w, /media/thumbnails/Video/thumbnail_640.jpg 640w",
+        )
 
 
 class HeroVideoSerializerTests(APITestCase):
@@ -29,9 +53,16 @@ class HeroVideoSerializerTests(APITestCase):
         }
 
     def test_contains_expected_fields(self):
-        serializer = HeroVideoSerializer(instance=self.hero_video_data)
+        serializer = HeroVideoSerializer(instance=Video(**self.hero_video_data))
         data = serializer.data
-        self.assertEqual(set(data.keys()), set(["title", "description", "teaser"]))
+        self.assertEqual(set(data.keys()), set(["id", "title", "description", "teaser", "teaser_hls_file"]))
+
+    def test_optimized_teaser_is_returned_once_it_is_ready(self):
+        video = Video(**self.hero_video_data)
+        self.assertEqual(HeroVideoSerializer(instance=video).data["teaser"], "/media/teaser.mp4")
+
+        video.teaser_optimized = "teaser_optimized.mp4"
+        self.assertEqual(HeroVideoSerializer(instance=video).data["teaser"], "/media/teaser_optimized.mp4")
 
 
 class VideoSerializerTests(APITestCase):
@@ -42,3 +73,29 @@ class VideoSerializerTests(APITestCase):
             "hls_file": "video_file.m3u8",
             "timestamp": 0,
         }
+
+    def test_only_existing_resolutions_are_returned(self):
+        with patch("content_app.signals.enqueue_conversion"):
+            video = Video.objects.create(title=self.video_data["title"], video_file="videos/Video_title/video_file.mp4")
+        for name, resolution, height in [("480p", "854x480", 480), ("360p", "640x360", 360)]:
+            Rendition.objects.create(
+                video=video,
+                name=name,
+                resolution=resolution,
+                height=height,
+                playlist=f"videos/Video_title/HLS_files/video_file_{name}.m3u8",
+            )
+        serializer = VideoSerializer(instance=video, context={"resolution": "1080"})
+        data = serializer.data
+        self.assertEqual(data["resolutions"], ["360", "480"])
+        self.assertIsNone(data["hls_file"])
+
+    def test_storyboard_is_returned(self):
+        with patch("content_app.signals.enqueue_conversion"):
+            video = Video.objects.create(
+                title=self.video_data["title"],
+                video_file="videos/Video_title/video_file.mp4",
+                storyboard="videos/Video_title/HLS_files/video_file_storyboard.vtt",
+            )
+        serializer = VideoSerializer(instance=video, context={"resolution": "360"})
+        self.assertEqual(serializer.data["storyboard"], "/media/videos/Video_title/HLS_files/video_file_storyboard.vtt")
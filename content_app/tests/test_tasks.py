@@ -0,0 +1,1078 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from content_app.functions import get_transcode_progress
+from content_app.management.commands.benchmark_transcode import BenchmarkQueue
+from content_app.models import Rendition, Video
+from content_app.tasks import (
+    SOURCE_HASH_START,
+    convert,
+    convert_rendition,
+    convert_to_hls,
+    convert_to_hls_ladder,
+    create_storyboard,
+    create_thumbnail_variants,
+    delete_rendition_files,
+    encoder_args,
+    enqueue_conversion,
+    finalize_conversion,
+    format_vtt_time,
+    get_ladder,
+    hash_block,
+    hash_file,
+    join_playlists,
+    ladder_fingerprint,
+    optimize_teaser,
+    probe_codecs,
+    probe_source,
+    progress_publisher,
+    queue_renditions,
+    read_segments,
+    reuse_conversion,
+    route_conversion,
+    run_ffmpeg,
+    select_audio_tracks,
+    select_resolutions,
+    split_into_chunks,
+    start_progress,
+    verify_rendition,
+    write_master_playlist,
+    write_storyboard_vtt,
+)
+from unittest.mock import MagicMock, patch
+from PIL import Image
+
+
+class ConvertToHlsLadderTests(TestCase):
+
+    @patch("content_app.tasks.subprocess.run")
+    def test_source_is_decoded_once(self, mock_run):
+        convert_to_hls_ladder("/media/source.mp4", "source", "/media/HLS_files", get_ladder())
+
+        self.assertEqual(mock_run.call_count, 1)
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd.count("-i"), 1)
+        self.assertIn("[0:v]split=4[v0][v1][v2][v3]", cmd[cmd.index("-filter_complex") + 1])
+
+    @patch("content_app.tasks.subprocess.run")
+    def test_every_resolution_gets_a_playlist(self, mock_run):
+        m3u8_files = convert_to_hls_ladder("/media/source.mp4", "source", "/media/HLS_files", get_ladder())
+
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(set(m3u8_files.keys()), set(get_ladder().keys()))
+        for suffix, m3u8_file in m3u8_files.items():
+            self.assertEqual(m3u8_file, f"/media/HLS_files/source_{suffix}.m3u8")
+            self.assertIn(m3u8_file, cmd)
+
+    @patch("content_app.tasks.subprocess.run")
+    def test_audio_is_encoded_once_per_bitrate(self, mock_run):
+        resolutions = get_ladder()
+        audio_tracks = select_audio_tracks(resolutions, has_audio=True)
+        m3u8_files = convert_to_hls_ladder(
+            "/media/source.mp4", "source", "/media/HLS_files", {**resolutions, **audio_tracks}
+        )
+
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(list(audio_tracks), ["audio_96k", "audio_128k"])
+        self.assertEqual(cmd.count("0:a:0"), 2)
+        self.assertEqual(cmd.count("-c:a"), 2)
+        self.assertEqual(m3u8_files["audio_128k"], "/media/HLS_files/source_audio_128k.m3u8")
+
+    @patch("content_app.tasks.subprocess.run")
+    def test_storyboard_is_written_from_the_same_decode(self, mock_run):
+        convert_to_hls_ladder(
+            "/media/source.mp4", "source", "/media/HLS_files", get_ladder(),
+            storyboard_prefix="/media/HLS_files/source_storyboard",
+        )
+
+        cmd = mock_run.call_args[0][0]
+        filter_graph = cmd[cmd.index("-filter_complex") + 1]
+        self.assertEqual(cmd.count("-i"), 1)
+        self.assertIn("[0:v]split=5[v0][v1][v2][v3][v4]", filter_graph)
+        self.assertIn("[v4]fps=1/10:eof_action=pass,", filter_graph)
+        self.assertIn("tile=10x10[storyboard]", filter_graph)
+        self.assertEqual(cmd[-1], "/media/HLS_files/source_storyboard_%03d.jpg")
+
+    def test_source_without_audio_gets_no_audio_tracks(self):
+        self.assertEqual(select_audio_tracks(get_ladder(), has_audio=False), {})
+
+
+class ConvertToHlsTests(TestCase):
+
+    @override_settings(HLS_SEGMENT_TYPE="mpegts")
+    @patch("content_app.tasks.subprocess.run")
+    def test_segments_are_written_by_the_encoder(self, mock_run):
+        m3u8_file = convert_to_hls("/media/source.mp4", "/media/HLS_files/source_360p", get_ladder()["360p"])
+
+        self.assertEqual(mock_run.call_count, 1)
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(m3u8_file, "/media/HLS_files/source_360p.m3u8")
+        self.assertEqual(cmd[-1], m3u8_file)
+        self.assertNotIn("copy", cmd)
+        self.assertFalse(any(part.endswith(".mp4") for part in cmd[3:]))
+
+    @override_settings(HLS_SEGMENT_TYPE="fmp4")
+    @patch("content_app.tasks.subprocess.run")
+    def test_fmp4_segments_are_written_into_one_file(self, mock_run):
+        convert_to_hls("/media/source.mp4", "/media/HLS_files/source_360p", get_ladder()["360p"])
+
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[cmd.index("-hls_segment_type") + 1], "fmp4")
+        self.assertEqual(cmd[cmd.index("-hls_flags") + 1], "single_file")
+        self.assertEqual(cmd[cmd.index("-hls_segment_filename") + 1], "/media/HLS_files/source_360p.mp4")
+
+
+class EncoderArgsTests(TestCase):
+
+    def test_rung_with_constant_quality(self):
+        args = encoder_args(
+            {"resolution": "640x360", "crf": 28, "maxrate": "800k", "bufsize": "1600k", "preset": "veryfast", "gop": 2}
+        )
+
+        self.assertEqual(args[args.index("-crf") + 1], "28")
+        self.assertEqual(args[args.index("-maxrate") + 1], "800k")
+        self.assertEqual(args[args.index("-bufsize") + 1], "1600k")
+        self.assertEqual(args[args.index("-preset") + 1], "veryfast")
+        self.assertEqual(args[args.index("-force_key_frames") + 1], "expr:gte(t,n_forced*2)")
+        self.assertNotIn("-b:v", args)
+
+    def test_rung_with_target_bitrate(self):
+        args = encoder_args({"resolution": "1280x720", "bitrate": "3000k", "audio_bitrate": "96k"})
+
+        self.assertEqual(args[args.index("-b:v") + 1], "3000k")
+        self.assertNotIn("-c:a", args)
+        self.assertNotIn("-crf", args)
+        self.assertNotIn("-maxrate", args)
+
+
+@patch("content_app.tasks.probe_source", return_value={"duration": 60.0, "height": 720})
+class RouteConversionTests(TestCase):
+
+    def setUp(self):
+        with patch("content_app.signals.enqueue_conversion"):
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/source.mp4",
+            )
+
+    @patch("content_app.tasks.get_queue")
+    def test_routing_is_queued_without_probing(self, mock_get_queue, mock_probe):
+        enqueue_conversion(self.video.id)
+
+        mock_probe.assert_not_called()
+        mock_get_queue.assert_called_once_with("background")
+        self.assertEqual(mock_get_queue.return_value.enqueue.call_args.args, (route_conversion, self.video.id, None))
+
+    @override_settings(TRANSCODE_MODE="single_pass")
+    @patch("content_app.tasks.get_queue")
+    def test_single_pass_enqueues_one_job(self, mock_get_queue, mock_probe):
+        route_conversion(self.video.id)
+
+        queue = mock_get_queue.return_value
+        self.assertEqual(queue.enqueue.call_count, 1)
+        self.assertEqual(queue.enqueue.call_args.args, (convert, self.video.id))
+
+    @override_settings(TRANSCODE_MODE="per_rendition")
+    @patch("content_app.tasks.get_queue")
+    def test_per_rendition_starts_with_queue_job(self, mock_get_queue, mock_probe):
+        route_conversion(self.video.id)
+
+        queue = mock_get_queue.return_value
+        self.assertEqual(queue.enqueue.call_count, 1)
+        self.assertEqual(queue.enqueue.call_args.args, (queue_renditions, self.video.id))
+
+    @override_settings(TRANSCODE_MODE="chunked")
+    @patch("content_app.tasks.get_queue")
+    def test_chunked_starts_with_split_job(self, mock_get_queue, mock_probe):
+        route_conversion(self.video.id)
+
+        queue = mock_get_queue.return_value
+        self.assertEqual(queue.enqueue.call_count, 1)
+        self.assertEqual(queue.enqueue.call_args.args, (split_into_chunks, self.video.id))
+
+    @override_settings(TRANSCODE_MODE="single_pass")
+    @patch("content_app.tasks.get_queue")
+    def test_mode_argument_overrides_setting(self, mock_get_queue, mock_probe):
+        route_conversion(self.video.id, "chunked")
+
+        queue = mock_get_queue.return_value
+        self.assertEqual(queue.enqueue.call_args.args, (split_into_chunks, self.video.id))
+
+    @override_settings(TRANSCODE_TIMEOUT_BASE=300, TRANSCODE_TIMEOUT_FACTOR=3)
+    @patch("content_app.tasks.get_queue")
+    def test_short_video_goes_to_short_queue(self, mock_get_queue, mock_probe):
+        route_conversion(self.video.id)
+
+        mock_get_queue.assert_called_once_with("transcode_short")
+        self.assertEqual(mock_get_queue.return_value.enqueue.call_args.kwargs["job_timeout"], 480)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.duration, 60.0)
+
+    @override_settings(TRANSCODE_TIMEOUT_BASE=300, TRANSCODE_TIMEOUT_FACTOR=3)
+    @patch("content_app.tasks.get_queue")
+    def test_long_video_goes_to_long_queue(self, mock_get_queue, mock_probe):
+        mock_probe.return_value = {"duration": 2 * 60 * 60.0, "height": 1080}
+
+        route_conversion(self.video.id)
+
+        mock_get_queue.assert_called_once_with("transcode_long")
+        self.assertEqual(mock_get_queue.return_value.enqueue.call_args.kwargs["job_timeout"], 21900)
+
+    @override_settings(TRANSCODE_TIMEOUT_MAX=3600)
+    @patch("content_app.tasks.get_queue")
+    def test_video_that_cannot_be_probed(self, mock_get_queue, mock_probe):
+        mock_probe.side_effect = FileNotFoundError("ffprobe")
+
+        route_conversion(self.video.id)
+
+        mock_get_queue.assert_called_once_with("transcode_long")
+        self.assertEqual(mock_get_queue.return_value.enqueue.call_args.kwargs["job_timeout"], 3600)
+
+    @patch("content_app.tasks.get_queue")
+    def test_probe_that_times_out(self, mock_get_queue, mock_probe):
+        mock_probe.side_effect = subprocess.TimeoutExpired("ffprobe", 60)
+
+        route_conversion(self.video.id)
+
+        mock_get_queue.assert_called_once_with("transcode_long")
+
+
+class QueueRenditionsTests(TestCase):
+
+    def setUp(self):
+        with patch("content_app.signals.enqueue_conversion"):
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/source.mp4",
+            )
+
+    @patch("content_app.tasks.get_queue")
+    @patch("content_app.tasks.reuse_conversion", return_value=False)
+    @patch("content_app.tasks.create_output_directory")
+    @patch("content_app.tasks.probe_source", return_value={"width": 854, "height": 480})
+    def test_fans_out_with_finalize_job(self, mock_probe, mock_output_dir, mock_reuse_conversion, mock_get_queue):
+        queue_renditions(self.video.id)
+
+        queue = mock_get_queue.return_value
+        calls = queue.enqueue.call_args_list
+        self.assertEqual([call.args[0] for call in calls[:-2]], [convert_rendition] * 2)
+        self.assertEqual([call.args[2] for call in calls[:-2]], ["360p", "480p"])
+        self.assertEqual(calls[-2].args, (create_storyboard, self.video.id))
+        self.assertEqual(calls[-1].args, (finalize_conversion, self.video.id))
+        self.assertEqual(len(calls[-1].kwargs["depends_on"]), 2)
+
+
+class ProbeSourceTests(TestCase):
+
+    @patch("content_app.tasks.subprocess.run")
+    def test_metadata_is_read_from_ffprobe(self, mock_run):
+        mock_run.return_value = MagicMock(
+            stdout="""{
+                "streams": [
+                    {"codec_type": "video", "codec_name": "h264", "width": 1280, "height": 720},
+                    {"codec_type": "audio", "codec_name": "aac"}
+                ],
+                "format": {"duration": "125.400000", "bit_rate": "2500000"}
+            }"""
+        )
+
+        metadata = probe_source("/media/source.mp4")
+
+        self.assertEqual(
+            metadata,
+            {
+                "duration": 125.4,
+                "width": 1280,
+                "height": 720,
+                "bitrate": 2500000,
+                "video_codec": "h264",
+                "audio_codec": "aac",
+            },
+        )
+
+
+class SelectResolutionsTests(TestCase):
+
+    def test_resolutions_above_source_are_skipped(self):
+        self.assertEqual(list(select_resolutions(480)), ["360p", "480p"])
+        self.assertEqual(list(select_resolutions(1080)), list(get_ladder()))
+
+    def test_lowest_resolution_is_always_kept(self):
+        self.assertEqual(list(select_resolutions(240)), ["360p"])
+
+    def test_unknown_height_keeps_all_resolutions(self):
+        self.assertEqual(list(select_resolutions(None)), list(get_ladder()))
+
+    @override_settings(HLS_LADDER=[
+        {"name": "1440p", "resolution": "2560x1440", "crf": 22},
+        {"name": "240p", "resolution": "426x240", "crf": 28},
+        {"name": "720p", "resolution": "1280x720", "crf": 23},
+    ])
+    def test_ladder_follows_the_setting(self):
+        self.assertEqual(list(select_resolutions(None)), ["240p", "720p", "1440p"])
+        self.assertEqual(list(select_resolutions(1080)), ["240p", "720p"])
+
+
+class FinalizeConversionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        with patch("content_app.signals.enqueue_conversion"):
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/source.mp4",
+            )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    @patch("content_app.tasks.check_rendition")
+    @patch("content_app.tasks.convert_to_hls")
+    def test_rendition_is_saved_when_it_is_done(self, mock_convert_to_hls, mock_check_rendition):
+        output_dir = os.path.join(self.media_root, "videos", "Test_Video", "HLS_files")
+        mock_convert_to_hls.return_value = os.path.join(output_dir, "source_360p.m3u8")
+
+        convert_rendition(self.video.id, "360p")
+
+        rendition = self.video.renditions.get()
+        self.assertEqual(rendition.name, "360p")
+        self.assertEqual(rendition.resolution, "640x360")
+        self.assertEqual(rendition.height, 360)
+        self.assertEqual(rendition.playlist.name, "videos/Test_Video/HLS_files/source_360p.m3u8")
+
+    @patch("content_app.tasks.convert_to_hls")
+    def test_finished_rendition_is_not_converted_again(self, mock_convert_to_hls):
+        output_dir = os.path.join(self.media_root, "videos", "Test_Video", "HLS_files")
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, "source_360p.m3u8"), "w") as file:
+            file.write("#EXTM3U\n#EXTINF:10.000000,\nsource_360p_000.ts\n#EXT-X-ENDLIST\n")
+        with open(os.path.join(output_dir, "source_360p_000.ts"), "wb") as file:
+            file.write(b"segment")
+        Rendition.objects.create(
+            video=self.video,
+            name="360p",
+            resolution="640x360",
+            height=360,
+            playlist="videos/Test_Video/HLS_files/source_360p.m3u8",
+        )
+
+        convert_rendition(self.video.id, "360p")
+
+        mock_convert_to_hls.assert_not_called()
+
+    @patch("content_app.tasks.write_master_playlist")
+    def test_master_playlist_is_saved(self, mock_write_master_playlist):
+        output_dir = os.path.join(self.media_root, "videos", "Test_Video", "HLS_files")
+        mock_write_master_playlist.return_value = os.path.join(output_dir, "source_master.m3u8")
+
+        finalize_conversion(self.video.id)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.hls_master_file.name, "videos/Test_Video/HLS_files/source_master.m3u8")
+
+    @patch("content_app.tasks.probe_codecs", return_value="avc1.64001e,mp4a.40.2")
+    def test_existing_hls_files_are_backfilled(self, mock_probe_codecs):
+        output_dir = os.path.join(self.media_root, "videos", "Test_Video", "HLS_files")
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, "source_480p.m3u8"), "w") as file:
+            file.write("#EXTM3U\n#EXTINF:10.000000,\nsource_480p_000.ts\n#EXT-X-ENDLIST\n")
+        with open(os.path.join(output_dir, "source_480p_000.ts"), "wb") as file:
+            file.write(b"0" * 1000)
+
+        call_command("backfill_renditions", stdout=StringIO())
+
+        rendition = self.video.renditions.get()
+        self.assertEqual(rendition.name, "480p")
+        self.assertEqual(rendition.codecs, "avc1.64001e,mp4a.40.2")
+        self.assertEqual(rendition.size, 1000)
+        self.assertEqual(rendition.segment_count, 1)
+        self.assertEqual(rendition.average_bandwidth, 800)
+
+
+class ReuseConversionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.source_dir = os.path.join(self.media_root, "videos", "Test_Video")
+        os.makedirs(os.path.join(self.source_dir, "HLS_files"))
+        for file_name in ["source.mp4", "copy.mp4"]:
+            with open(os.path.join(self.source_dir, file_name), "wb") as file:
+                file.write(b"source")
+
+        with patch("content_app.signals.enqueue_conversion"):
+            self.original = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/source.mp4",
+                height=360,
+                duration=10,
+                source_hash=hash_file(os.path.join(self.source_dir, "source.mp4")),
+                ladder_fingerprint=ladder_fingerprint(),
+                hls_master_file="videos/Test_Video/HLS_files/source_master.m3u8",
+            )
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/copy.mp4",
+                height=360,
+                duration=10,
+            )
+
+        output_dir = os.path.join(self.source_dir, "HLS_files")
+        with open(os.path.join(output_dir, "source_360p.m3u8"), "w") as file:
+            file.write("#EXTM3U\n#EXTINF:10.000000,\nsource_360p_000.ts\n#EXT-X-ENDLIST\n")
+        with open(os.path.join(output_dir, "source_360p_000.ts"), "wb") as file:
+            file.write(b"0" * 1000)
+        Rendition.objects.create(
+            video=self.original,
+            name="360p",
+            resolution="640x360",
+            height=360,
+            playlist="videos/Test_Video/HLS_files/source_360p.m3u8",
+        )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def reuse_conversion(self):
+        output_dir = os.path.join(self.source_dir, "HLS_files")
+        source_path = os.path.join(self.source_dir, "copy.mp4")
+        return reuse_conversion(self.video, source_path, "copy", output_dir)
+
+    def test_hash_file(self):
+        source_hash = hash_file(os.path.join(self.source_dir, "source.mp4"))
+        self.assertEqual(source_hash, hash_block(SOURCE_HASH_START, b"source"))
+
+    @override_settings(UPLOAD_BLOCK_SIZE=4)
+    def test_hash_file_chains_the_blocks(self):
+        source_hash = hash_file(os.path.join(self.source_dir, "source.mp4"))
+        self.assertEqual(source_hash, hash_block(hash_block(SOURCE_HASH_START, b"sour"), b"ce"))
+
+    @patch("content_app.tasks.probe_codecs", return_value="avc1.64001e,mp4a.40.2")
+    def test_renditions_of_the_same_source_are_reused(self, mock_probe_codecs):
+        self.assertTrue(self.reuse_conversion())
+
+        output_dir = os.path.join(self.source_dir, "HLS_files")
+        with open(os.path.join(output_dir, "copy_360p.m3u8")) as file:
+            self.assertIn("copy_360p_000.ts", file.read())
+        self.assertTrue(os.path.samefile(
+            os.path.join(output_dir, "source_360p_000.ts"), os.path.join(output_dir, "copy_360p_000.ts")
+        ))
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.source_hash, self.original.source_hash)
+        self.assertEqual(self.video.renditions.get().playlist.name, "videos/Test_Video/HLS_files/copy_360p.m3u8")
+        self.assertEqual(self.video.hls_master_file.name, "videos/Test_Video/HLS_files/copy_master.m3u8")
+
+    @patch("content_app.tasks.probe_codecs", return_value="avc1.64001e,mp4a.40.2")
+    def test_import_of_the_same_file_keeps_the_files(self, mock_probe_codecs):
+        output_dir = os.path.join(self.source_dir, "HLS_files")
+        self.video.video_file = "videos/Test_Video/source.mp4"
+
+        self.assertTrue(reuse_conversion(self.video, os.path.join(self.source_dir, "source.mp4"), "source", output_dir))
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "source_360p_000.ts")))
+        with open(os.path.join(output_dir, "source_360p.m3u8")) as file:
+            self.assertIn("source_360p_000.ts", file.read())
+        self.assertEqual(self.video.renditions.get().playlist.name, "videos/Test_Video/HLS_files/source_360p.m3u8")
+
+    @patch("content_app.tasks.probe_codecs", return_value="avc1.64001e,mp4a.40.2")
+    def test_renditions_joined_from_chunks_are_reused(self, mock_probe_codecs):
+        output_dir = os.path.join(self.source_dir, "HLS_files")
+        with open(os.path.join(output_dir, "source_360p.m3u8"), "w") as file:
+            file.write(
+                "#EXTM3U\n#EXTINF:5.000000,\nsource_c000_360p_000.ts\n"
+                "#EXT-X-DISCONTINUITY\n#EXTINF:5.000000,\nsource_c001_360p_000.ts\n#EXT-X-ENDLIST\n"
+            )
+        for file_name in ["source_c000_360p_000.ts", "source_c001_360p_000.ts"]:
+            with open(os.path.join(output_dir, file_name), "wb") as file:
+                file.write(b"0" * 1000)
+
+        self.assertTrue(self.reuse_conversion())
+        with open(os.path.join(output_dir, "copy_360p.m3u8")) as file:
+            playlist = file.read()
+        self.assertIn("\ncopy_360p_000.ts\n", playlist)
+        self.assertIn("\ncopy_360p_001.ts\n", playlist)
+        self.assertTrue(os.path.samefile(
+            os.path.join(output_dir, "source_c001_360p_000.ts"), os.path.join(output_dir, "copy_360p_001.ts")
+        ))
+
+    @patch("content_app.tasks.link_file", side_effect=OSError("No space left on device"))
+    def test_failed_link_falls_back_to_encoding(self, mock_link_file):
+        self.assertFalse(self.reuse_conversion())
+        self.assertFalse(self.video.renditions.exists())
+
+    def test_renditions_are_not_reused_with_other_settings(self):
+        ladder = [dict(settings.HLS_LADDER[0], crf=18)]
+        with override_settings(HLS_LADDER=ladder):
+            self.assertFalse(self.reuse_conversion())
+        self.assertFalse(self.video.renditions.exists())
+
+    def test_renditions_are_not_reused_for_another_source(self):
+        with open(os.path.join(self.source_dir, "copy.mp4"), "wb") as file:
+            file.write(b"another source")
+
+        self.assertFalse(self.reuse_conversion())
+
+
+class BenchmarkTranscodeTests(TestCase):
+
+    def fake_transcode(self, clip_path, title, mode, workers):
+        output_dir = os.path.join(os.path.dirname(clip_path), "HLS_files")
+        os.makedirs(output_dir)
+        renditions = {}
+        for suffix in ["360p", "480p", "audio_96k", "audio_128k"]:
+            with open(os.path.join(output_dir, f"clip_{suffix}.m3u8"), "w") as file:
+                file.write(f"#EXTM3U\n#EXTINF:10.000000,\nclip_{suffix}_000.ts\n#EXT-X-ENDLIST\n")
+            with open(os.path.join(output_dir, f"clip_{suffix}_000.ts"), "wb") as file:
+                file.write(b"0" * 1000)
+            renditions[suffix] = {"size": 1000, "segment_count": 1, "average_bandwidth": 800, "bandwidth": 800}
+        return renditions
+
+    def fake_create_clip(self, clip_dir, resolution, duration):
+        os.makedirs(clip_dir)
+        clip_path = os.path.join(clip_dir, "clip.mp4")
+        with open(clip_path, "wb") as file:
+            file.write(b"0" * 100)
+        return clip_path
+
+    @patch("content_app.management.commands.benchmark_transcode.teardown_databases")
+    @patch("content_app.management.commands.benchmark_transcode.setup_databases")
+    @patch("content_app.management.commands.benchmark_transcode.create_clip")
+    def test_report(self, mock_create_clip, mock_setup_databases, mock_teardown_databases):
+        mock_create_clip.side_effect = self.fake_create_clip
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        stdout = StringIO()
+
+        with self.settings(MEDIA_ROOT=media_root), \
+                patch("content_app.management.commands.benchmark_transcode.transcode_clip", self.fake_transcode):
+            call_command(
+                "benchmark_transcode",
+                "--durations", "10",
+                "--resolutions", "854x480",
+                "--workers", "2",
+                stdout=stdout,
+                stderr=StringIO(),
+            )
+
+        mock_teardown_databases.assert_called_once_with(mock_setup_databases.return_value, verbosity=0)
+        self.assertEqual(os.listdir(os.path.join(media_root, "videos")), [])
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report["ladder_fingerprint"], ladder_fingerprint())
+        self.assertEqual(report["workers"], 2)
+        result = report["results"][0]
+        self.assertEqual(result["resolution"], "854x480")
+        self.assertEqual(list(result["renditions"]), ["360p", "480p", "audio_96k", "audio_128k"])
+        self.assertEqual(result["renditions"]["360p"]["segment_count"], 1)
+        self.assertEqual(result["renditions"]["360p"]["average_bandwidth"], 800)
+        self.assertGreater(result["output_bytes"], 4000)
+        self.assertGreaterEqual(result["cpu_seconds"], 0)
+
+    def test_queue_runs_jobs_after_their_dependencies(self):
+        finished = []
+
+        def job(name):
+            time.sleep(0.05 if name == "chunk_000" else 0)
+            finished.append(name)
+
+        def split():
+            chunk_jobs = [queue.enqueue(job, f"chunk_{index:03d}") for index in range(3)]
+            queue.enqueue(job, "join", depends_on=chunk_jobs)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            queue = BenchmarkQueue(executor)
+            queue.enqueue(split)
+            queue.join()
+
+        self.assertCountEqual(finished[:3], ["chunk_000", "chunk_001", "chunk_002"])
+        self.assertEqual(finished[3], "join")
+
+    def test_queue_raises_errors_of_jobs(self):
+        def failing_job():
+            raise RuntimeError("The HLS files are incomplete.")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            queue = BenchmarkQueue(executor)
+            queue.enqueue(failing_job)
+            with self.assertRaises(RuntimeError):
+                queue.join()
+
+
+@override_settings(STORYBOARD={"interval": 10, "tile_width": 160, "tile_height": 90, "columns": 2, "rows": 2})
+class StoryboardTests(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.storyboard_prefix = os.path.join(self.folder, "source_storyboard")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_cues_point_to_the_tiles_of_the_sprites(self):
+        vtt_path = write_storyboard_vtt(self.storyboard_prefix, 45.5)
+
+        with open(vtt_path) as file:
+            lines = file.read().splitlines()
+        self.assertEqual(vtt_path, f"{self.storyboard_prefix}.vtt")
+        self.assertEqual(lines[0], "WEBVTT")
+        cues = [line for line in lines if "-->" in line]
+        self.assertEqual(cues[0], "00:00:00.000 --> 00:00:10.000")
+        self.assertEqual(cues[-1], "00:00:40.000 --> 00:00:45.500")
+        self.assertEqual(
+            [line for line in lines if "#xywh=" in line],
+            [
+                "source_storyboard_000.jpg#xywh=0,0,160,90",
+                "source_storyboard_000.jpg#xywh=160,0,160,90",
+                "source_storyboard_000.jpg#xywh=0,90,160,90",
+                "source_storyboard_000.jpg#xywh=160,90,160,90",
+                "source_storyboard_001.jpg#xywh=0,0,160,90",
+            ],
+        )
+
+    def test_vtt_time_format(self):
+        self.assertEqual(format_vtt_time(3725.5), "01:02:05.500")
+
+
+class ThumbnailVariantsTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, THUMBNAIL_WIDTHS=[320, 640, 1280])
+        self.override.enable()
+        os.makedirs(os.path.join(self.media_root, "thumbnails", "Test_Video"))
+        Image.new("RGBA", (800, 450), (200, 30, 30, 255)).save(
+            os.path.join(self.media_root, "thumbnails", "Test_Video", "thumbnail.png")
+        )
+        with patch("content_app.signals.enqueue_conversion"), \
+                patch("content_app.signals.enqueue_thumbnail_variants") as self.mock_enqueue:
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnails/Test_Video/thumbnail.png",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/source.mp4",
+            )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_new_thumbnail_is_queued(self):
+        self.mock_enqueue.assert_called_once_with(self.video.id)
+
+    def test_variants_are_created_without_upscaling(self):
+        create_thumbnail_variants(self.video.id)
+
+        self.video.refresh_from_db()
+        variants = self.video.thumbnail_variants
+        self.assertEqual(variants["source"], "thumbnails/Test_Video/thumbnail.png")
+        self.assertEqual(variants["webp"], {
+            "320": "thumbnails/Test_Video/thumbnail_320.webp",
+            "640": "thumbnails/Test_Video/thumbnail_640.webp",
+        })
+        with Image.open(os.path.join(self.media_root, variants["jpeg"]["320"])) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (320, 180)))
+        with Image.open(os.path.join(self.media_root, variants["webp"]["640"])) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (640, 360)))
+
+    def test_saved_variants_are_not_queued_again(self):
+        create_thumbnail_variants(self.video.id)
+        self.video.refresh_from_db()
+
+        with patch("content_app.signals.enqueue_thumbnail_variants") as mock_enqueue:
+            self.video.save()
+
+        mock_enqueue.assert_not_called()
+
+    def test_pending_variants_are_not_queued_again(self):
+        with patch("content_app.signals.enqueue_conversion") as mock_enqueue_conversion, \
+                patch("content_app.signals.enqueue_thumbnail_variants") as mock_enqueue:
+            self.video.description = "An edited description"
+            self.video.save()
+            video = Video.objects.get(id=self.video.id)
+            video.save()
+
+        mock_enqueue.assert_not_called()
+        mock_enqueue_conversion.assert_not_called()
+
+    def test_replaced_thumbnail_is_queued(self):
+        video = Video.objects.get(id=self.video.id)
+        video.thumbnail = "thumbnails/Test_Video/other.png"
+
+        with patch("content_app.signals.enqueue_thumbnail_variants") as mock_enqueue:
+            video.save()
+            video.save()
+
+        mock_enqueue.assert_called_once_with(video.id)
+
+
+class OptimizeTeaserTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        with patch("content_app.signals.enqueue_conversion"), \
+                patch("content_app.signals.enqueue_teaser_optimization") as self.mock_enqueue:
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="videos/Test_Video/teaser/teaser.mov",
+                video_file="videos/Test_Video/source.mp4",
+            )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_new_teaser_is_queued(self):
+        self.mock_enqueue.assert_called_once_with(self.video.id)
+
+    def test_pending_teaser_is_not_queued_again(self):
+        with patch("content_app.signals.enqueue_teaser_optimization") as mock_enqueue:
+            Video.objects.get(id=self.video.id).save()
+
+        mock_enqueue.assert_not_called()
+
+    @patch("content_app.tasks.run_ffmpeg")
+    def test_teaser_is_encoded_with_faststart(self, mock_run_ffmpeg):
+        with patch("content_app.signals.enqueue_teaser_optimization") as mock_enqueue:
+            optimize_teaser(self.video.id)
+            self.video.refresh_from_db()
+            self.video.save()
+
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        self.assertEqual(cmd[cmd.index("-movflags") + 1], "+faststart")
+        self.assertEqual(cmd[-1], os.path.join(self.media_root, "videos/Test_Video/teaser/teaser_optimized.mp4"))
+        self.assertEqual(self.video.teaser_optimized.name, "videos/Test_Video/teaser/teaser_optimized.mp4")
+        self.assertFalse(self.video.teaser_hls_file)
+        mock_enqueue.assert_not_called()
+
+    @patch("content_app.tasks.write_master_playlist")
+    @patch("content_app.tasks.convert_to_hls_ladder")
+    @patch("content_app.tasks.probe_source", return_value={"height": 720, "audio_codec": "aac"})
+    @patch("content_app.tasks.run_ffmpeg")
+    def test_teaser_ladder_is_optional(self, mock_run_ffmpeg, mock_probe, mock_ladder, mock_master):
+        output_dir = os.path.join(self.media_root, "videos", "Test_Video", "teaser", "HLS_files")
+        mock_master.return_value = os.path.join(output_dir, "teaser_optimized_master.m3u8")
+
+        with self.settings(TEASER={**settings.TEASER, "hls_resolutions": ["360p", "480p", "1080p"]}):
+            optimize_teaser(self.video.id)
+
+        resolutions = mock_ladder.call_args[0][3]
+        self.assertEqual(list(resolutions), ["360p", "480p", "audio_96k", "audio_128k"])
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.teaser_hls_file.name, "videos/Test_Video/teaser/HLS_files/teaser_optimized_master.m3u8")
+
+    @patch("content_app.tasks.write_master_playlist")
+    @patch("content_app.tasks.convert_to_hls_ladder")
+    @patch("content_app.tasks.probe_source", return_value={"height": 720, "audio_codec": ""})
+    @patch("content_app.tasks.run_ffmpeg")
+    def test_unknown_teaser_rungs_fall_back_to_the_lowest_rung(self, mock_run_ffmpeg, mock_probe, mock_ladder, mock_master):
+        mock_master.return_value = os.path.join(self.media_root, "videos", "Test_Video", "teaser", "teaser_optimized_master.m3u8")
+
+        with self.settings(TEASER={**settings.TEASER, "hls_resolutions": ["240p"]}):
+            optimize_teaser(self.video.id)
+
+        resolutions = mock_ladder.call_args[0][3]
+        self.assertEqual(list(resolutions), ["360p"])
+
+
+class JoinPlaylistsTests(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.playlists = []
+        for chunk_index, durations in enumerate([(10.0, 10.0, 0.08), (10.0, 4.5)]):
+            playlist = os.path.join(self.folder, f"chunk_{chunk_index}.m3u8")
+            with open(playlist, "w") as file:
+                file.write("#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:10\n#EXT-X-MEDIA-SEQUENCE:0\n")
+                for index, duration in enumerate(durations):
+                    file.write(f"#EXTINF:{duration:.6f},\nchunk_{chunk_index}_{index:03d}.ts\n")
+                file.write("#EXT-X-ENDLIST\n")
+            self.playlists.append(playlist)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_segments_are_joined_in_order(self):
+        output_path = os.path.join(self.folder, "joined.m3u8")
+        join_playlists(self.playlists, output_path)
+
+        with open(output_path) as file:
+            lines = file.read().splitlines()
+        segments = [line for line in lines if not line.startswith("#")]
+        self.assertEqual(
+            segments,
+            ["chunk_0_000.ts", "chunk_0_001.ts", "chunk_0_002.ts", "chunk_1_000.ts", "chunk_1_001.ts"],
+        )
+        self.assertEqual(lines.count("#EXT-X-ENDLIST"), 1)
+        self.assertIn("#EXT-X-TARGETDURATION:10", lines)
+
+    def test_fmp4_chunks_are_joined_with_discontinuity(self):
+        playlists = []
+        for chunk_index in range(2):
+            playlist = os.path.join(self.folder, f"fmp4_chunk_{chunk_index}.m3u8")
+            with open(playlist, "w") as file:
+                file.write(
+                    "#EXTM3U\n#EXT-X-VERSION:7\n#EXT-X-TARGETDURATION:10\n"
+                    f'#EXT-X-MAP:URI="chunk_{chunk_index}.mp4",BYTERANGE="800@0"\n'
+                    "#EXTINF:10.000000,\n#EXT-X-BYTERANGE:5000@800\n"
+                    f"chunk_{chunk_index}.mp4\n#EXT-X-ENDLIST\n"
+                )
+            playlists.append(playlist)
+        output_path = os.path.join(self.folder, "joined.m3u8")
+        join_playlists(playlists, output_path)
+
+        with open(output_path) as file:
+            lines = file.read().splitlines()
+        self.assertIn("#EXT-X-VERSION:7", lines)
+        self.assertEqual(
+            lines[4:],
+            [
+                '#EXT-X-MAP:URI="chunk_0.mp4",BYTERANGE="800@0"',
+                "#EXTINF:10.000000,",
+                "#EXT-X-BYTERANGE:5000@800",
+                "chunk_0.mp4",
+                "#EXT-X-DISCONTINUITY",
+                '#EXT-X-MAP:URI="chunk_1.mp4",BYTERANGE="800@0"',
+                "#EXTINF:10.000000,",
+                "#EXT-X-BYTERANGE:5000@800",
+                "chunk_1.mp4",
+                "#EXT-X-ENDLIST",
+            ],
+        )
+
+
+class WriteMasterPlaylistTests(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for suffix, segment_size in [("360p", 50000), ("480p", 100000)]:
+            with open(os.path.join(self.folder, f"source_{suffix}.m3u8"), "w") as file:
+                file.write("#EXTM3U\n#EXT-X-TARGETDURATION:10\n")
+                for index in range(2):
+                    file.write(f"#EXTINF:10.000000,\nsource_{suffix}_{index:03d}.ts\n")
+                    with open(os.path.join(self.folder, f"source_{suffix}_{index:03d}.ts"), "wb") as segment:
+                        segment.write(b"0" * segment_size * (index + 1))
+                file.write("#EXT-X-ENDLIST\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    @patch("content_app.tasks.probe_codecs", return_value="avc1.64001e,mp4a.40.2")
+    def test_variants_of_created_resolutions_are_listed(self, mock_probe_codecs):
+        master_path = write_master_playlist(self.folder, "source", get_ladder())
+
+        with open(master_path) as file:
+            lines = file.read().splitlines()
+        self.assertEqual(master_path, os.path.join(self.folder, "source_master.m3u8"))
+        self.assertEqual(lines[0], "#EXTM3U")
+        self.assertEqual(
+            [line for line in lines if not line.startswith("#")],
+            ["source_360p.m3u8", "source_480p.m3u8"],
+        )
+        self.assertIn(
+            '#EXT-X-STREAM-INF:BANDWIDTH=80000,AVERAGE-BANDWIDTH=60000,'
+            'RESOLUTION=640x360,CODECS="avc1.64001e,mp4a.40.2"',
+            lines,
+        )
+
+    @patch("content_app.tasks.probe_codecs")
+    def test_variants_reference_their_audio_track(self, mock_probe_codecs):
+        mock_probe_codecs.side_effect = lambda media_file: "mp4a.40.2" if "audio" in media_file else "avc1.64001e"
+        with open(os.path.join(self.folder, "source_audio_96k.m3u8"), "w") as file:
+            file.write("#EXTM3U\n#EXTINF:10.000000,\nsource_audio_96k_000.ts\n#EXT-X-ENDLIST\n")
+        with open(os.path.join(self.folder, "source_audio_96k_000.ts"), "wb") as segment:
+            segment.write(b"0" * 12500)
+        resolutions = get_ladder()
+
+        master_path = write_master_playlist(
+            self.folder, "source", {**resolutions, **select_audio_tracks(resolutions, has_audio=True)}
+        )
+
+        with open(master_path) as file:
+            lines = file.read().splitlines()
+        self.assertIn(
+            '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio_96k",NAME="Audio",DEFAULT=YES,AUTOSELECT=YES,'
+            'URI="source_audio_96k.m3u8"',
+            lines,
+        )
+        self.assertIn(
+            '#EXT-X-STREAM-INF:BANDWIDTH=90000,AVERAGE-BANDWIDTH=70000,'
+            'RESOLUTION=640x360,CODECS="avc1.64001e,mp4a.40.2",AUDIO="audio_96k"',
+            lines,
+        )
+        self.assertIn(
+            '#EXT-X-STREAM-INF:BANDWIDTH=160000,AVERAGE-BANDWIDTH=120000,'
+            'RESOLUTION=854x480,CODECS="avc1.64001e"',
+            lines,
+        )
+
+
+class ProbeCodecsTests(TestCase):
+
+    @patch("content_app.tasks.subprocess.run")
+    def test_codecs_are_returned_for_hls(self, mock_run):
+        mock_run.return_value = MagicMock(
+            stdout="""{
+                "streams": [
+                    {"codec_name": "h264", "profile": "High", "level": 31},
+                    {"codec_name": "aac", "profile": "LC"}
+                ]
+            }"""
+        )
+
+        self.assertEqual(probe_codecs("/media/source_720p_000.ts"), "avc1.64001f,mp4a.40.2")
+
+
+class VerifyRenditionTests(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.m3u8_path = os.path.join(self.folder, "source_360p.m3u8")
+        self.segments = ["source_360p_000.ts", "source_360p_001.ts"]
+        for segment in self.segments:
+            with open(os.path.join(self.folder, segment), "wb") as file:
+                file.write(b"segment")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_playlist(self, finished=True):
+        with open(self.m3u8_path, "w") as file:
+            file.write("#EXTM3U\n#EXT-X-TARGETDURATION:10\n")
+            for segment in self.segments:
+                file.write(f"#EXTINF:10.000000,\n{segment}\n")
+            if finished:
+                file.write("#EXT-X-ENDLIST\n")
+
+    def test_complete_rendition(self):
+        self.write_playlist()
+        self.assertTrue(verify_rendition(self.m3u8_path, 20.0))
+
+    def test_unfinished_playlist(self):
+        self.write_playlist(finished=False)
+        self.assertFalse(verify_rendition(self.m3u8_path))
+
+    def test_missing_segment(self):
+        self.write_playlist()
+        os.remove(os.path.join(self.folder, self.segments[1]))
+        self.assertFalse(verify_rendition(self.m3u8_path))
+
+    def test_duration_does_not_match_source(self):
+        self.write_playlist()
+        self.assertFalse(verify_rendition(self.m3u8_path, 60.0))
+
+    def test_byte_ranges_have_to_fit_into_the_file(self):
+        with open(os.path.join(self.folder, "source_360p.mp4"), "wb") as file:
+            file.write(b"0" * 2000)
+        with open(self.m3u8_path, "w") as file:
+            file.write(
+                '#EXTM3U\n#EXT-X-MAP:URI="source_360p.mp4",BYTERANGE="500@0"\n'
+                "#EXTINF:10.000000,\n#EXT-X-BYTERANGE:1000@500\nsource_360p.mp4\n"
+                "#EXTINF:10.000000,\n#EXT-X-BYTERANGE:1000\nsource_360p.mp4\n#EXT-X-ENDLIST\n"
+            )
+
+        self.assertEqual(
+            read_segments(self.m3u8_path),
+            [(10.0, "source_360p.mp4", (1000, 500)), (10.0, "source_360p.mp4", (1000, 1500))],
+        )
+        self.assertFalse(verify_rendition(self.m3u8_path, 20.0))
+        with open(os.path.join(self.folder, "source_360p.mp4"), "ab") as file:
+            file.write(b"0" * 500)
+        self.assertTrue(verify_rendition(self.m3u8_path, 20.0))
+
+    def test_partial_files_are_deleted(self):
+        self.write_playlist(finished=False)
+        open(os.path.join(self.folder, "source_480p_000.ts"), "w").close()
+
+        delete_rendition_files(self.folder, "source_360p")
+
+        self.assertEqual(os.listdir(self.folder), ["source_480p_000.ts"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TranscodeProgressTests(TestCase):
+
+    @patch("content_app.tasks.subprocess.Popen")
+    def test_progress_reports_are_parsed(self, mock_popen):
+        process = mock_popen.return_value
+        process.stdout = MagicMock()
+        process.stdout.__iter__.return_value = iter([
+            "frame=250\n", "fps=50.00\n", "out_time_us=10000000\n", "speed=2.5x\n", "progress=continue\n",
+            "frame=500\n", "fps=51.00\n", "out_time_us=20000000\n", "speed=2.6x\n", "progress=end\n",
+        ])
+        process.returncode = 0
+        reports = []
+
+        run_ffmpeg(["ffmpeg", "-i", "/media/source.mp4", "/media/out.m3u8"], reports.append)
+
+        cmd = mock_popen.call_args[0][0]
+        self.assertEqual(cmd[:4], ["ffmpeg", "-progress", "pipe:1", "-nostats"])
+        self.assertEqual([report["out_time_us"] for report in reports], ["10000000", "20000000"])
+
+    @patch("content_app.tasks.subprocess.Popen")
+    def test_failed_progress_does_not_stop_the_encode(self, mock_popen):
+        process = mock_popen.return_value
+        process.stdout = MagicMock()
+        process.stdout.__iter__.return_value = iter(["progress=continue\n", "progress=end\n"])
+        process.returncode = 0
+        on_progress = MagicMock(side_effect=ConnectionError("Redis is not available"))
+
+        run_ffmpeg(["ffmpeg", "-i", "/media/source.mp4", "/media/out.m3u8"], on_progress)
+
+        self.assertEqual(on_progress.call_count, 2)
+        process.kill.assert_not_called()
+        process.wait.assert_called_once()
+
+    @patch("content_app.tasks.subprocess.Popen")
+    def test_ffmpeg_is_killed_when_reading_fails(self, mock_popen):
+        process = mock_popen.return_value
+        process.stdout = MagicMock()
+        process.stdout.__iter__.side_effect = UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        with self.assertRaises(UnicodeDecodeError):
+            run_ffmpeg(["ffmpeg", "-i", "/media/source.mp4", "/media/out.m3u8"], MagicMock())
+
+        process.kill.assert_called_once()
+        process.wait.assert_called_once()
+
+    def test_progress_is_published_per_rendition(self):
+        start_progress(1, ["360p", "480p"])
+        publish = progress_publisher(1, ["360p"], 40.0)
+
+        publish({"out_time_us": "10000000", "fps": "50.00", "speed": "2.5x", "progress": "continue"})
+
+        progress = get_transcode_progress(1)
+        self.assertEqual(progress["360p"], {"percent": 25.0, "fps": 50.0, "speed": 2.5, "done": False})
+        self.assertEqual(progress["480p"]["percent"], 0)
@@ -1,10 +1,20 @@
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.authtoken.models import Token
 from authentication_app.models import CustomUser
-from content_app.models import Video
+from content_app.models import Rendition, UploadSession, Video
+from content_app.functions import parse_playlist
+from content_app.tasks import hash_file, save_storyboard
 from content_app.serializers import DashboardVideoSerializer, HeroVideoSerializer, VideoSerializer
 from watch_history_app.models import WatchHistory
 from freezegun import freeze_time
@@ -69,7 +79,39 @@ class DashboardViewTests(APITestCase):
         self.assertEqual(response.data["latest_videos"], self.latest_videos)
         self.assertEqual(response.data["my_videos"], self.my_videos)
         self.assertCountEqual(response.data["categories"], self.categories)
-        self.assertEqual(response.data["category_videos"], self.categorized_videos)
+        self.assertEqual(
+            response.data["category_videos"],
+            {category: videos[::-1] for category, videos in self.categorized_videos.items()},
+        )
+
+    @override_settings(DASHBOARD_CATEGORY_VIDEOS=2)
+    def test_category_videos_are_capped(self):
+        url = reverse("dashboard")
+
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["category_videos"],
+            {category: videos[::-1][:2] for category, videos in self.categorized_videos.items()},
+        )
+
+    def test_query_count_does_not_grow_with_categories(self):
+        url = reverse("dashboard")
+        with self.assertNumQueries(4):
+            self.client.get(url, format="json")
+
+        for category in ["comedy", "horror", "thriller"]:
+            Video.objects.create(
+                title=f"Test Video {category}",
+                description="A test video description",
+                category=category,
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="video.mp4",
+            )
+        with self.assertNumQueries(4):
+            response = self.client.get(url, format="json")
+        self.assertEqual(len(response.data["categories"]), 6)
 
     @patch(
         "content_app.views.get_latest_videos",
@@ -91,16 +133,6 @@ class DashboardViewTests(APITestCase):
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @patch(
-        "content_app.models.Video.objects.values_list",
-        side_effect=Exception("Get categories failed"),
-    )
-    def test_get_categories_fails(self, mock_get_categories):
-        url = reverse("dashboard")
-
-        response = self.client.get(url, format="json")
-        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
-
     @patch(
         "content_app.views.get_category_videos",
         side_effect=Exception("Get latest videos failed"),
@@ -334,3 +366,457 @@ class HeroViewTests(APITestCase):
 
         response = self.client.get(url_with_query, format="json")
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TranscodeProgressViewTests(APITestCase):
+
+    def setUp(self):
+        self.user, created = CustomUser.objects.get_or_create(
+            username="testuser", password="test1234"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+
+    def test_get_progress(self):
+        cache.set("transcode_progress_1", ["360p"])
+        cache.set("transcode_progress_1_360p", {"percent": 50.0, "fps": 40.0, "speed": 1.6, "done": False})
+        url = reverse("progress")
+        url_with_query = f"{url}?id=1"
+
+        response = self.client.get(url_with_query, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["progress"]["360p"]["percent"], 50.0)
+
+    def test_no_id(self):
+        url = reverse("progress")
+
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token 123456")
+        url = reverse("progress")
+        url_with_query = f"{url}?id=1"
+
+        response = self.client.get(url_with_query, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, created = CustomUser.objects.get_or_create(
+            username="testuser", password="test1234"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+        self.video = Video.objects.create(
+            id=1,
+            title="Test Video",
+            description="A test video description",
+            category="drama",
+            thumbnail="thumbnail.jpg",
+            teaser="teaser.mp4",
+            video_file="video.mp4",
+        )
+
+    def get_again(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], format="json")
+
+    def test_dashboard_not_modified(self):
+        url = reverse("dashboard")
+
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertIn("private", response["Cache-Control"])
+
+        with self.assertNumQueries(1):
+            not_modified = self.get_again(url, response)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+    def test_dashboard_changes_with_watch_history(self):
+        url = reverse("dashboard")
+
+        response = self.client.get(url, format="json")
+        WatchHistory.objects.create(user=self.user, video=self.video, timestamp=10)
+        changed = self.get_again(url, response)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed["ETag"], response["ETag"])
+        self.assertEqual(len(changed.data["my_videos"]), 1)
+
+    def test_hero_changes_with_catalog(self):
+        url = f"{reverse('hero')}?id=1"
+
+        response = self.client.get(url, format="json")
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertEqual(self.get_again(url, response).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.video.title = "New Title"
+        self.video.save()
+        changed = self.get_again(url, response)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.data["title"], "New Title")
+
+    def test_video_not_modified(self):
+        url = f"{reverse('video')}?id=1&resolution=360p"
+
+        response = self.client.get(url, format="json")
+        self.assertEqual(self.get_again(url, response).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with freeze_time(datetime.now() + timedelta(minutes=10)):
+            changed = self.get_again(url, response)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+    def test_task_updates_change_catalog(self):
+        url = f"{reverse('video')}?id=1&resolution=360p"
+
+        response = self.client.get(url, format="json")
+        vtt_path = os.path.join(settings.MEDIA_ROOT, "videos", "Test_Video", "HLS_files", "video_storyboard.vtt")
+        with patch("content_app.tasks.write_storyboard_vtt", return_value=vtt_path):
+            save_storyboard(1, os.path.splitext(vtt_path)[0], 10)
+        changed = self.get_again(url, response)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertTrue(changed.data["storyboard"])
+
+
+class UploadViewTests(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name, UPLOAD_DIR=self.upload_dir.name)
+        self.settings_override.enable()
+
+        self.user = CustomUser.objects.create(username="admin", is_staff=True)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+        self.content = b"0123456789" * 10
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+        self.upload_dir.cleanup()
+
+    def start_upload(self):
+        image = io.BytesIO()
+        Image.new("RGB", (16, 9)).save(image, "JPEG")
+        data = {
+            "title": "Test Video",
+            "description": "A test video description",
+            "category": "drama",
+            "thumbnail": SimpleUploadedFile("thumbnail.jpg", image.getvalue(), content_type="image/jpeg"),
+            "teaser": SimpleUploadedFile("teaser.mp4", b"teaser", content_type="video/mp4"),
+            "filename": "../source.mp4",
+            "size": len(self.content),
+        }
+        return self.client.post(reverse("uploads"), data, format="multipart")
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.generic(
+            "PATCH",
+            reverse("upload-chunk", args=[upload_id]),
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_start_upload(self):
+        response = self.start_upload()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["offset"], 0)
+        self.assertEqual(response.data["filename"], "source.mp4")
+
+    @override_settings(UPLOAD_BLOCK_SIZE=16)
+    @patch("content_app.signals.enqueue_teaser_optimization")
+    @patch("content_app.signals.enqueue_thumbnail_variants")
+    @patch("content_app.signals.enqueue_conversion")
+    def test_upload_in_chunks(self, mock_enqueue_conversion, mock_thumbnail, mock_teaser):
+        upload_id = self.start_upload().data["id"]
+
+        response = self.send_chunk(upload_id, 0, self.content[:60])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Upload-Offset"], "60")
+        self.assertIsNone(response.data["video"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.send_chunk(upload_id, 60, self.content[60:])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        video = Video.objects.get(id=response.data["video"])
+        self.assertEqual(video.title, "Test Video")
+        self.assertEqual(video.source_hash, hash_file(video.video_file.path))
+        with open(video.video_file.path, "rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(os.listdir(self.upload_dir.name), [])
+        mock_enqueue_conversion.assert_called_once()
+
+    def test_resume_upload(self):
+        upload_id = self.start_upload().data["id"]
+        self.send_chunk(upload_id, 0, self.content[:40])
+
+        response = self.send_chunk(upload_id, 20, self.content[20:60])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 40)
+
+        response = self.client.get(reverse("upload-chunk", args=[upload_id]))
+        self.assertEqual(response["Upload-Offset"], "40")
+
+    def test_chunk_exceeds_size(self):
+        upload_id = self.start_upload().data["id"]
+
+        response = self.send_chunk(upload_id, 0, self.content + b"0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 0)
+
+    def test_missing_offset(self):
+        upload_id = self.start_upload().data["id"]
+
+        response = self.client.generic(
+            "PATCH", reverse("upload-chunk", args=[upload_id]), b"0", content_type="application/offset+octet-stream"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_admin(self):
+        self.user.is_staff = False
+        self.user.save()
+
+        response = self.start_upload()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MediaViewTests(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name, MEDIA_SENDFILE_BACKEND="")
+        self.settings_override.enable()
+        os.makedirs(os.path.join(self.media_root.name, "videos", "Test_Video", "teaser"))
+        self.content = bytes(range(100))
+        with open(os.path.join(self.media_root.name, "videos", "Test_Video", "teaser", "teaser.mp4"), "wb") as file:
+            file.write(self.content)
+        self.url = reverse("media", args=["videos/Test_Video/teaser/teaser.mp4"])
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_get_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_get_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+
+    def test_get_open_and_suffix_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=90-")
+        self.assertEqual(b"".join(response.streaming_content), self.content[90:])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(response["Content-Range"], "bytes 95-99/100")
+        self.assertEqual(b"".join(response.streaming_content), self.content[95:])
+
+    def test_range_not_satisfiable(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response["Content-Range"], "bytes */100")
+
+    def test_path_outside_media_root(self):
+        response = self.client.get(reverse("media", args=["../secret.txt"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND="x-accel-redirect", MEDIA_ACCEL_PREFIX="/protected-media/")
+    def test_x_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/videos/Test_Video/teaser/teaser.mp4")
+        self.assertEqual(response.content, b"")
+
+    @override_settings(MEDIA_SENDFILE_BACKEND="x-sendfile")
+    def test_x_sendfile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response["X-Sendfile"],
+            os.path.join(self.media_root.name, "videos", "Test_Video", "teaser", "teaser.mp4"),
+        )
+
+
+class SignedMediaTests(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root.name,
+            MEDIA_SENDFILE_BACKEND="",
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+        )
+        self.settings_override.enable()
+        self.user, created = CustomUser.objects.get_or_create(username="testuser", password="test1234")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+
+        output_dir = os.path.join(self.media_root.name, "videos", "Test_Video", "HLS_files")
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, "source_360p.m3u8"), "w") as file:
+            file.write(
+                "#EXTM3U\n#EXT-X-MAP:URI=\"source_360p.mp4\",BYTERANGE=\"800@0\"\n"
+                "#EXTINF:10.000000,\n#EXT-X-BYTERANGE:1000@800\nsource_360p.mp4\n#EXT-X-ENDLIST\n"
+            )
+        with open(os.path.join(output_dir, "source_360p.mp4"), "wb") as file:
+            file.write(b"0" * 1800)
+        with open(os.path.join(output_dir, "source_storyboard.vtt"), "w") as file:
+            file.write("WEBVTT\n\n00:00:00.000 --> 00:00:10.000\nsource_storyboard_000.jpg#xywh=0,0,160,90\n")
+
+        with patch("content_app.signals.enqueue_conversion"):
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="A test video description",
+                thumbnail="thumbnail.jpg",
+                teaser="teaser.mp4",
+                video_file="videos/Test_Video/source.mp4",
+                storyboard="videos/Test_Video/HLS_files/source_storyboard.vtt",
+            )
+        Rendition.objects.create(
+            video=self.video,
+            name="360p",
+            resolution="640x360",
+            height=360,
+            playlist="videos/Test_Video/HLS_files/source_360p.m3u8",
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def get_video(self):
+        response = self.client.get(f"{reverse('video')}?id={self.video.id}&resolution=360")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_playlist_is_signed(self):
+        hls_file = self.get_video()["hls_file"]
+        path, query_string = hls_file.split("?")
+
+        response = self.client.get(hls_file)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        playlist = response.content.decode()
+        self.assertIn(f'#EXT-X-MAP:URI="source_360p.mp4?{query_string}"', playlist)
+        self.assertIn(f"\nsource_360p.mp4?{query_string}\n", playlist)
+
+        response = self.client.get(path.replace(".m3u8", ".mp4") + "?" + query_string)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_playlist_is_parsed_once(self):
+        hls_file = self.get_video()["hls_file"]
+        parse_playlist.cache_clear()
+
+        first_response = self.client.get(hls_file)
+        second_response = self.client.get(hls_file)
+        self.assertEqual(first_response.content, second_response.content)
+        self.assertEqual(parse_playlist.cache_info().misses, 1)
+        self.assertEqual(parse_playlist.cache_info().hits, 1)
+
+    def test_changed_playlist_is_parsed_again(self):
+        hls_file = self.get_video()["hls_file"]
+        m3u8_path = os.path.join(self.media_root.name, "videos", "Test_Video", "HLS_files", "source_360p.m3u8")
+        self.client.get(hls_file)
+
+        with open(m3u8_path, "w") as file:
+            file.write("#EXTM3U\n#EXTINF:10.000000,\nsource_360p_000.ts\n#EXT-X-ENDLIST\n")
+        os.utime(m3u8_path, ns=(0, os.stat(m3u8_path).st_mtime_ns + 1_000_000_000))
+
+        response = self.client.get(hls_file)
+        self.assertIn("source_360p_000.ts?", response.content.decode())
+
+    def test_segments_from_segment_host(self):
+        hls_file = self.get_video()["hls_file"]
+
+        with override_settings(MEDIA_SEGMENT_URL="https://cdn.example.com/media/"):
+            response = self.client.get(hls_file)
+        self.assertIn(
+            "\nhttps://cdn.example.com/media/videos/Test_Video/HLS_files/source_360p.mp4?", response.content.decode()
+        )
+
+    def test_storyboard_is_signed(self):
+        storyboard = self.get_video()["storyboard"]
+        query_string = storyboard.split("?")[1]
+
+        response = self.client.get(storyboard)
+        self.assertIn(f"source_storyboard_000.jpg?{query_string}#xywh=0,0,160,90", response.content.decode())
+
+    def test_segment_without_signature(self):
+        response = self.client.get(reverse("media", args=["videos/Test_Video/HLS_files/source_360p.mp4"]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_normalized_paths_without_signature(self):
+        for path in [
+            "videos//Test_Video/HLS_files/source_360p.mp4",
+            "videos/Test_Video/./HLS_files/source_360p.mp4",
+            "videos/X/../Test_Video/HLS_files/source_360p.mp4",
+        ]:
+            response = self.client.get(f"/media/{path}")
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, path)
+
+    def test_normalized_path_with_signature(self):
+        hls_file = self.get_video()["hls_file"].replace("/videos/Test_Video/", "/videos/X/../Test_Video/")
+
+        response = self.client.get(hls_file)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_source_without_signature(self):
+        with open(os.path.join(self.media_root.name, "videos", "Test_Video", "source.mp4"), "wb") as file:
+            file.write(b"0" * 100)
+
+        response = self.client.get(reverse("media", args=["videos/Test_Video/source.mp4"]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_teaser_folder_without_signature(self):
+        os.makedirs(os.path.join(self.media_root.name, "videos", "Test_Video", "teaser"))
+        with open(os.path.join(self.media_root.name, "videos", "Test_Video", "teaser", "teaser.mp4"), "wb") as file:
+            file.write(b"0" * 100)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("media", args=["videos/Test_Video/teaser/teaser.mp4"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_tampered_signature(self):
+        hls_file = self.get_video()["hls_file"].replace(f"video={self.video.id}", "video=999")
+
+        response = self.client.get(hls_file)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_signature_of_another_folder(self):
+        hls_file = self.get_video()["hls_file"].replace("Test_Video", "Other_Video")
+        os.makedirs(os.path.join(self.media_root.name, "videos", "Other_Video", "HLS_files"))
+        with open(os.path.join(self.media_root.name, "videos", "Other_Video", "HLS_files", "source_360p.m3u8"), "w") as file:
+            file.write("#EXTM3U\n")
+
+        response = self.client.get(hls_file)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_expired_signature(self):
+        hls_file = self.get_video()["hls_file"]
+
+        with freeze_time("2100-01-01"):
+            response = self.client.get(hls_file)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
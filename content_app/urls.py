@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import DashboardView, HeroView, VideoView
+from .views import DashboardView, HeroView, TranscodeProgressView, UploadChunkView, UploadView, VideoView
 
 urlpatterns = [
     path("dashboard/", DashboardView.as_view(), name="dashboard"),
     path("hero/", HeroView.as_view(), name="hero"),
     path("video/", VideoView.as_view(), name="video"),
+    path("progress/", TranscodeProgressView.as_view(), name="progress"),
+    path("uploads/", UploadView.as_view(), name="uploads"),
+    path("uploads/<uuid:upload_id>/", UploadChunkView.as_view(), name="upload-chunk"),
 ]
\ No newline at end of file
@@ -1,24 +1,47 @@
+import os
 from django.core.cache import cache
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.conf import settings
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.views import View
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from content_app.models import Video
+from content_app.models import UploadSession, Video
+from content_app.serializers import UploadSessionSerializer
+from content_app.tasks import get_content_versions
 from content_app.functions import (
+    MEDIA_CONTENT_TYPES,
+    check_media_access,
+    complete_upload,
     get_category_videos,
+    get_content_etag,
     get_latest_video,
     get_latest_videos,
     get_my_videos,
+    get_not_modified_response,
     get_selected_video,
+    get_transcode_progress,
     get_user_timestamp,
+    get_media_name,
+    get_media_path,
     get_video,
+    media_query_string,
+    media_url_expiry,
+    send_media_file,
+    set_cache_headers,
+    sign_playlist,
+    sign_video_urls,
+    write_upload_chunk,
 )
 
 
 CACHE_TTL = getattr(settings, "CACHE_TTL", DEFAULT_TIMEOUT)
+USER_CACHE_CONTROL = {"private": True, "no_cache": True}
+# The hero data is the same for every user and its teasers are public, so shared caches may keep it as well.
+HERO_CACHE_CONTROL = {"public": True, "max_age": CACHE_TTL}
 
 
 class DashboardView(APIView):
@@ -28,19 +51,25 @@ class DashboardView(APIView):
         This function returns the data for the dashboard. It gets the 6 latest videos, the videos the user has watched, all the categories and the videos sorted by categories.
         """
         user = request.user
-        cache_key = f"dashboard_{user.id}"
+        catalog_version, watch_history_version = get_content_versions("catalog", f"watch_history_{user.id}")
+        etag = get_content_etag("dashboard", user.id, catalog_version, watch_history_version)
+        not_modified = get_not_modified_response(request, etag, USER_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
+
+        cache_key = f"dashboard_{user.id}_{catalog_version}"
         cached_data = cache.get(cache_key)
 
         try:
             if cached_data:
                 cached_data["my_videos"] = get_my_videos(request)
-                return Response(cached_data, status=status.HTTP_200_OK)
+                return set_cache_headers(Response(cached_data, status=status.HTTP_200_OK), etag, USER_CACHE_CONTROL)
 
             else:
                 latest_videos = get_latest_videos()
                 my_videos = get_my_videos(request)
-                categories = Video.objects.values_list("category", flat=True).distinct()
-                category_videos = get_category_videos(categories)
+                category_videos = get_category_videos()
+                categories = list(category_videos)
 
                 response_data = {
                     "latest_videos": latest_videos,
@@ -50,7 +79,7 @@ class DashboardView(APIView):
                 }
                 cache.set(cache_key, response_data, CACHE_TTL)
 
-            return Response(response_data, status=status.HTTP_200_OK)
+            return set_cache_headers(Response(response_data, status=status.HTTP_200_OK), etag, USER_CACHE_CONTROL)
 
         except Exception as e:
             return Response(
@@ -61,7 +90,6 @@ class DashboardView(APIView):
             )
 
 
-@method_decorator(cache_page(CACHE_TTL), name="dispatch")
 class HeroView(APIView):
     serializer_class = None
     def get(self, request):
@@ -69,11 +97,22 @@ class HeroView(APIView):
         This function returns the data for the hero area. If the user is new on the page, the latest video is returned, else the selected video.
         """
         video_id = request.query_params.get("id")
+        (catalog_version,) = get_content_versions("catalog")
+        etag = get_content_etag("hero", video_id, catalog_version)
+        not_modified = get_not_modified_response(request, etag, HERO_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
+
+        cache_key = f"hero_{video_id}_{catalog_version}"
+        cached_data = cache.get(cache_key)
+        if cached_data:
+            return set_cache_headers(Response(cached_data, status=status.HTTP_200_OK), etag, HERO_CACHE_CONTROL)
 
         if video_id == "-1":
             try:
                 latest_video = get_latest_video()
-                return Response(latest_video, status=status.HTTP_200_OK)
+                cache.set(cache_key, latest_video, CACHE_TTL)
+                return set_cache_headers(Response(latest_video, status=status.HTTP_200_OK), etag, HERO_CACHE_CONTROL)
             except:
                 return Response(
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -82,7 +121,8 @@ class HeroView(APIView):
         else:
             try:
                 video = get_selected_video(video_id)
-                return Response(video, status=status.HTTP_200_OK)
+                cache.set(cache_key, video, CACHE_TTL)
+                return set_cache_headers(Response(video, status=status.HTTP_200_OK), etag, HERO_CACHE_CONTROL)
             except Video.DoesNotExist:
                 return Response(
                     {"message": "Video not found"}, status=status.HTTP_404_NOT_FOUND
@@ -100,7 +140,7 @@ class VideoView(APIView):
     serializer_class = None
     def get(self, request):
         """
-        This function returns the video data for the actual video the user wants to watch. It returns the m3u8 file based on the given resolution.
+        This function returns the video data for the actual video the user wants to watch. It returns the signed m3u8 file based on the given resolution and the storyboard.
         """
         video_id = request.query_params.get("id")
         user = request.user
@@ -109,18 +149,27 @@ class VideoView(APIView):
         if not (video_id and resolution):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        cache_key = f"video_{video_id}_{resolution}"
+        catalog_version, watch_history_version = get_content_versions("catalog", f"watch_history_{user.id}")
+        etag = get_content_etag(
+            "video", video_id, resolution, user.id, catalog_version, watch_history_version, media_url_expiry()
+        )
+        not_modified = get_not_modified_response(request, etag, USER_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
+
+        cache_key = f"video_{video_id}_{resolution}_{catalog_version}"
         cached_data = cache.get(cache_key)
 
         try:
             if cached_data:
                 cached_data["timestamp"] = get_user_timestamp(user, video_id)
-                return Response(cached_data, status=status.HTTP_200_OK)
+                response = Response(sign_video_urls(cached_data, user, video_id), status=status.HTTP_200_OK)
             else:
                 video = get_video(video_id, user, resolution)
                 cache.set(cache_key, video, CACHE_TTL)
                 video["timestamp"] = get_user_timestamp(user, video_id)
-                return Response(video, status=status.HTTP_200_OK)
+                response = Response(sign_video_urls(video, user, video_id), status=status.HTTP_200_OK)
+            return set_cache_headers(response, etag, USER_CACHE_CONTROL)
 
         except Video.DoesNotExist:
             return Response(
@@ -131,3 +180,130 @@ class VideoView(APIView):
                 {"message": f"An error occurred while loading video data. {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+
+class TranscodeProgressView(APIView):
+    serializer_class = None
+    def get(self, request):
+        """
+        This function returns the live progress of the conversion of a video. For every resolution or chunk it returns the percent, fps and speed of the encode.
+        """
+        video_id = request.query_params.get("id")
+
+        if not video_id:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            progress = get_transcode_progress(video_id)
+            return Response({"id": video_id, "progress": progress}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"message": f"An error occurred while loading the transcode progress. {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class UploadView(APIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        """
+        This function starts a chunked upload of a source video.
+        """
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        upload_session = serializer.save(created_by=request.user)
+        return Response(UploadSessionSerializer(upload_session).data, status=status.HTTP_201_CREATED)
+
+
+class UploadChunkView(APIView):
+    serializer_class = None
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, upload_id):
+        """
+        This function returns how many bytes of an upload have arrived, so an interrupted upload can be resumed at this offset.
+        """
+        try:
+            upload_session = UploadSession.objects.get(id=upload_id)
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        response = Response(UploadSessionSerializer(upload_session).data, status=status.HTTP_200_OK)
+        response["Upload-Offset"] = upload_session.offset
+        return response
+
+    def patch(self, request, upload_id):
+        """
+        This function appends a chunk to a locked upload and creates the video once the last chunk has arrived.
+        """
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            content_length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "Upload-Offset and Content-Length are required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with transaction.atomic():
+                try:
+                    upload_session = UploadSession.objects.select_for_update().get(id=upload_id)
+                except UploadSession.DoesNotExist:
+                    return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+                if upload_session.video_id:
+                    return Response({"error": "Upload is already complete"}, status=status.HTTP_409_CONFLICT)
+
+                if offset != upload_session.offset:
+                    response = Response(
+                        {"error": "Upload-Offset does not match", "offset": upload_session.offset},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                    response["Upload-Offset"] = upload_session.offset
+                    return response
+
+                if offset + content_length > upload_session.size:
+                    return Response(
+                        {"error": "The chunk exceeds the size of the upload"}, status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                new_offset = write_upload_chunk(upload_session, offset, request._request, content_length)
+                if new_offset == upload_session.size:
+                    complete_upload(upload_session)
+
+            response = Response(UploadSessionSerializer(upload_session).data, status=status.HTTP_200_OK)
+            response["Upload-Offset"] = new_offset
+            return response
+        except Exception as e:
+            return Response(
+                {"message": f"An error occurred while saving the upload. {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class MediaView(View):
+    def get(self, request, path):
+        """
+        This function serves the HLS files, thumbnails and teasers to users that may access them.
+        """
+        file_path = get_media_path(path)
+        if not file_path:
+            raise Http404("Media file not found")
+        media_name = get_media_name(file_path)
+        if not check_media_access(request, media_name):
+            return HttpResponse(status=403)
+
+        extension = os.path.splitext(file_path)[1]
+        if request.GET.get("signature") and extension in [".m3u8", ".vtt"]:
+            segment_host = ""
+            if settings.MEDIA_SEGMENT_URL:
+                segment_host = f"{settings.MEDIA_SEGMENT_URL}{os.path.dirname(media_name)}/"
+            return HttpResponse(
+                sign_playlist(file_path, media_query_string(request), segment_host),
+                content_type=MEDIA_CONTENT_TYPES[extension],
+            )
+        return send_media_file(request, file_path)
@@ -152,6 +152,23 @@ INTERNAL_IPS = os.getenv("INTERNAL_IPS", default="127.0.0.1").split(",")
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Media files are handed to the front proxy, so no Python worker streams them. "x-accel-redirect" is for nginx and needs
+# an internal location at MEDIA_ACCEL_PREFIX with MEDIA_ROOT as its alias, "x-sendfile" is for Apache and lighttpd.
+# If it is empty, Django sends the files itself with os.sendfile.
+MEDIA_SENDFILE_BACKEND = os.getenv("MEDIA_SENDFILE_BACKEND", default="")
+MEDIA_ACCEL_PREFIX = "/protected-media/"
+
+# The files of paths that match one of SIGNED_MEDIA_PATHS are only served with a signature, which VideoView adds to
+# the URLs. This covers the HLS files and the uploaded sources. The signature is bound to the user, the video and the
+# folder of the files. It expires after SIGNED_MEDIA_MAX_AGE seconds, which has to cover the playback of the longest
+# video, because the segments are loaded while watching. The HLS files of the teasers in PUBLIC_MEDIA_PATHS and the
+# teaser files of the videos stay public for the hero section.
+SIGNED_MEDIA_PATHS = [r"videos/"]
+PUBLIC_MEDIA_PATHS = [r"videos/[^/]+/teaser/"]
+SIGNED_MEDIA_MAX_AGE = 60 * 60 * 6
+# If it is set, the signed playlists load their segments and sprites from this URL, for example a CDN in front of the
+# media folder. The playlists themselves are still served by Django.
+MEDIA_SEGMENT_URL = os.getenv("MEDIA_SEGMENT_URL", default="")
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
@@ -197,14 +214,90 @@ CACHES = {
 
 CACHE_TTL = 60 * 15  # 15 minutes
 
+# The dashboard shows the newest DASHBOARD_CATEGORY_VIDEOS videos of every category.
+DASHBOARD_CATEGORY_VIDEOS = 30
+
+RQ_CONNECTION = {
+    "HOST": os.getenv("RQ_HOST", default="localhost"),
+    "PORT": os.getenv("RQ_PORT", default="6379"),
+    "DB": 0,
+    "PASSWORD": REDIS_PASSWORD,
+}
+
+# Transcode jobs are routed by the duration of the source, so short clips never wait behind long films. Workers take
+# jobs from the queues in the order they are listed, for example "python manage.py rqworker transcode_short transcode
+# transcode_long". Emails, thumbnails and other small jobs use the "background" queue, which needs its own worker.
 RQ_QUEUES = {
-    "default": {
-        "HOST": os.getenv("RQ_HOST", default="localhost"),
-        "PORT": os.getenv("RQ_PORT", default="6379"),
-        "DB": 0,
-        "PASSWORD": REDIS_PASSWORD,
-        "DEFAULT_TIMEOUT": 360,
-    },
+    "default": {**RQ_CONNECTION, "DEFAULT_TIMEOUT": 360},
+    "transcode_short": {**RQ_CONNECTION, "DEFAULT_TIMEOUT": 360},
+    "transcode": {**RQ_CONNECTION, "DEFAULT_TIMEOUT": 360},
+    "transcode_long": {**RQ_CONNECTION, "DEFAULT_TIMEOUT": 360},
+    "background": {**RQ_CONNECTION, "DEFAULT_TIMEOUT": 60},
+}
+
+# The queue of a source is the first one whose "max_duration" in seconds is not exceeded. Sources with an unknown
+# duration go to the last queue.
+TRANSCODE_QUEUES = [
+    {"name": "transcode_short", "max_duration": 10 * 60},
+    {"name": "transcode", "max_duration": 60 * 60},
+    {"name": "transcode_long", "max_duration": None},
+]
+# FFprobe is stopped after PROBE_TIMEOUT seconds. The probe runs in a job on the "background" queue, which then
+# routes the conversion.
+PROBE_TIMEOUT = 60
+# A transcode job may run TRANSCODE_TIMEOUT_BASE seconds plus TRANSCODE_TIMEOUT_FACTOR seconds for every second of its
+# source, but not longer than TRANSCODE_TIMEOUT_MAX. Sources with an unknown duration get the maximum.
+TRANSCODE_TIMEOUT_BASE = 300
+TRANSCODE_TIMEOUT_FACTOR = 3
+TRANSCODE_TIMEOUT_MAX = 60 * 60 * 12
+
+# "single_pass" decodes the source once for all resolutions in one job, "per_rendition" converts every resolution in its own job
+# and "chunked" splits the source into chunks of TRANSCODE_CHUNK_SECONDS that are converted in parallel jobs.
+TRANSCODE_MODE = os.getenv("TRANSCODE_MODE", default="single_pass")
+TRANSCODE_CHUNK_SECONDS = 120
+
+# The encoding ladder. Every rung becomes one rendition of the HLS files, rungs higher than the source are left out.
+# A rung uses a constant quality ("crf") or a target bitrate ("bitrate"), which can be capped with "maxrate" and "bufsize".
+# "preset" trades encode speed against quality and "gop" is the distance between keyframes in seconds. All rungs should
+# use the same "gop" and it should divide HLS_SEGMENT_SECONDS, so the segments of all renditions line up.
+HLS_LADDER = [
+    {"name": "360p", "resolution": "640x360", "crf": 23, "maxrate": "1000k", "bufsize": "2000k",
+     "preset": "medium", "gop": 2, "audio_bitrate": "96k"},
+    {"name": "480p", "resolution": "854x480", "crf": 23, "maxrate": "1600k", "bufsize": "3200k",
+     "preset": "medium", "gop": 2, "audio_bitrate": "128k"},
+    {"name": "720p", "resolution": "1280x720", "crf": 23, "maxrate": "3500k", "bufsize": "7000k",
+     "preset": "medium", "gop": 2, "audio_bitrate": "128k"},
+    {"name": "1080p", "resolution": "1920x1080", "crf": 23, "maxrate": "6000k", "bufsize": "12000k",
+     "preset": "medium", "gop": 2, "audio_bitrate": "128k"},
+]
+HLS_SEGMENT_SECONDS = 10
+# "fmp4" writes all segments of a rendition into one fMP4 file that the playlists address by byte ranges,
+# "mpegts" writes every segment into its own TS file for legacy players.
+HLS_SEGMENT_TYPE = os.getenv("HLS_SEGMENT_TYPE", default="fmp4")
+
+# The storyboard for seek previews takes a thumbnail every "interval" seconds. The thumbnails are put together
+# into sprites of "columns" x "rows" tiles, which a WebVTT file maps to the time ranges of the video.
+STORYBOARD = {"interval": 10, "tile_width": 160, "tile_height": 90, "columns": 10, "rows": 10}
+
+# The widths in pixels of the WebP and JPEG variants that are created for every thumbnail.
+THUMBNAIL_WIDTHS = [320, 640, 1280]
+
+# Chunked uploads of source videos are written here until the last chunk has arrived. It is outside of MEDIA_ROOT,
+# so unfinished uploads are never served. The chunks are streamed to the disk in blocks of UPLOAD_BLOCK_SIZE bytes.
+# The source hashes are built from blocks of this size, so changing it stops the reuse of older conversions.
+UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# The uploaded teasers are cut to "max_seconds", scaled down to "height" and re-encoded with a capped bitrate for the
+# hero section. If "hls_resolutions" names rungs of HLS_LADDER, a small HLS ladder is created for the teaser as well.
+TEASER = {
+    "max_seconds": 30,
+    "height": 720,
+    "crf": 28,
+    "maxrate": "1500k",
+    "bufsize": "3000k",
+    "audio_bitrate": "96k",
+    "hls_resolutions": [],
 }
 
 IMPORT_EXPORT_USE_TRANSACTIONS = True